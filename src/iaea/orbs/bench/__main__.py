@@ -0,0 +1,90 @@
+import argparse
+import sys
+from dataclasses import fields
+
+from iaea.orbs import HelpFormatter
+
+from iaea.orbs.bench.suite import compare_results
+from iaea.orbs.bench.suite import print_comparison
+from iaea.orbs.bench.suite import run_benchmarks
+from iaea.orbs.bench.suite import save_results
+from iaea.orbs.bench.synthetic import SyntheticConfig
+from iaea.orbs.utils import load_json_data
+
+
+def parse_arguments():
+    """
+    Parse command-line arguments for the benchmark suite
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m iaea.orbs.bench",
+        description="ORBS processing benchmarks on synthetic data",
+        formatter_class=HelpFormatter
+    )
+
+    parser.add_argument(
+        "-o", "--output",
+        type=str,
+        default="bench_results.json",
+        help="File to save the results to (default: %(default)s)"
+    )
+
+    parser.add_argument(
+        "-b", "--baseline",
+        type=str,
+        default=None,
+        help="Results file of an earlier run to compare against (default: %(default)s)"
+    )
+
+    parser.add_argument(
+        "-t", "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative slowdown or memory growth reported as a regression (default: %(default)s)"
+    )
+
+    parser.add_argument(
+        "-n", "--repeat",
+        type=int,
+        default=5,
+        help="Timed runs per stage (default: %(default)s)"
+    )
+
+    parser.add_argument(
+        "-s", "--stages",
+        nargs="+",
+        default=None,
+        help="Stages to run, all of them when not given (default: %(default)s)"
+    )
+
+    defaults = SyntheticConfig()
+    for field in fields(SyntheticConfig):
+        parser.add_argument(
+            f"--{field.name}",
+            type=int,
+            default=getattr(defaults, field.name),
+            help=f"Synthetic dataset: {field.name.replace('_', ' ')} (default: %(default)s)"
+        )
+
+    return parser.parse_args()
+
+
+def main():
+    """Run the benchmarks, save them and compare them to a baseline"""
+    args = parse_arguments()
+    config = SyntheticConfig(**{field.name: getattr(args, field.name)
+                                for field in fields(SyntheticConfig)})
+
+    results = run_benchmarks(config, args.repeat, args.stages)
+    save_results(results, args.output)
+    print(f"Results saved to '{args.output}'")
+
+    if args.baseline:
+        rows = compare_results(results, load_json_data(args.baseline), args.threshold)
+        print_comparison(rows)
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import argparse
+import json
+import tempfile
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from iaea.orbs import HelpFormatter
+from iaea.orbs.bench.mock_server import MockOrbsServer
+from iaea.orbs.bench.mock_server import MockServerConfig
+from iaea.orbs.bench.mock_server import add_server_arguments
+from iaea.orbs.bench.mock_server import server_config
+from iaea.orbs.metrics import metrics
+from iaea.orbs.process.download_orbs import DATASETS
+from iaea.orbs.process.download_orbs import DownloadConfig
+from iaea.orbs.process.download_orbs import RateLimiter
+from iaea.orbs.process.download_orbs import download_dataset
+from iaea.orbs.process.download_orbs import local_file_numbers
+from iaea.orbs.process.manifest import DownloadManifest
+
+
+def served_file_numbers(data_dir: str, limit: Optional[int] = None) -> Dict[str, List[int]]:
+    """
+    File numbers to request per download category: every number up to the
+    highest file present, so that the gaps between stations are requested too
+    """
+    numbers = {}
+    for category, prefix in DATASETS.values():
+        present = local_file_numbers(Path(data_dir) / category, prefix)
+        numbers[category] = list(range(1, max(present, default=0) + 1))[:limit]
+    return numbers
+
+
+def download_pass(base_url: str, file_numbers: Dict[str, List[int]], output_dir: str,
+                  manifest: DownloadManifest, workers: int,
+                  requests_per_second: float) -> dict:
+    """Download every category once, returning the wall time and the download counters"""
+    metrics.pop_counters()
+    limiter = RateLimiter(requests_per_second)
+    skipped = 0
+    start = time.perf_counter()
+    for category, prefix in DATASETS.values():
+        config = DownloadConfig(category, prefix, file_numbers[category], workers,
+                                requests_per_second)
+        skipped += len(download_dataset(base_url, config, output_dir, limiter, manifest))
+    elapsed = time.perf_counter() - start
+
+    counters = metrics.pop_counters()
+    requested = sum(len(numbers) for numbers in file_numbers.values())
+    return {
+        "wall_s": round(elapsed, 4),
+        "requests_per_s": round(requested / elapsed, 2) if elapsed else None,
+        "mib_per_s": round(counters["download.bytes"] / 2 ** 20 / elapsed, 3) if elapsed else None,
+        "skipped": skipped,
+        "counters": dict(sorted(counters.items())),
+    }
+
+
+def run_download_benchmark(data_dir: str, workers: List[int],
+                           server: Optional[MockServerConfig] = None,
+                           requests_per_second: float = 0.0,
+                           limit: Optional[int] = None) -> dict:
+    """
+    Download the files of a download directory from a mock ORBS server with each
+    number of workers: once into an empty directory, then again revalidating
+    them with the manifest of the first pass
+    """
+    file_numbers = served_file_numbers(data_dir, limit)
+    results = {}
+    for count in workers:
+        with tempfile.TemporaryDirectory(prefix="orbs-download-") as work_dir, \
+                MockOrbsServer(data_dir, server) as mock:
+            manifest = DownloadManifest(str(Path(work_dir) / "manifest.json"))
+            output_dir = str(Path(work_dir) / "downloaded_CSVs")
+            passes = {}
+            for name in ("cold", "revalidate"):
+                mock.responses.clear()
+                passes[name] = download_pass(mock.url, file_numbers, output_dir, manifest,
+                                             count, requests_per_second)
+                passes[name]["responses"] = dict(sorted(mock.responses.items()))
+                print(f"workers={count:<3} {name:<10} {passes[name]['wall_s']:>8.2f} s "
+                      f"{passes[name]['requests_per_s']:>8.1f} req/s "
+                      f"{passes[name]['mib_per_s']:>8.2f} MiB/s  "
+                      f"responses {passes[name]['responses']}")
+            results[str(count)] = passes
+    return results
+
+
+def parse_arguments():
+    """
+    Parse command-line arguments for the download throughput harness
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m iaea.orbs.bench.download",
+        description="Downloader throughput and failure handling against a local mock ORBS server",
+        formatter_class=HelpFormatter
+    )
+    parser.add_argument(
+        "-w", "--workers",
+        type=int,
+        nargs="+",
+        default=[1, 4, 8],
+        help="Numbers of download workers to measure (default: %(default)s)"
+    )
+    parser.add_argument(
+        "-r", "--requests_per_second",
+        type=float,
+        default=0.0,
+        help="Downloader request budget, 0 disables it (default: %(default)s)"
+    )
+    parser.add_argument(
+        "-l", "--limit",
+        type=int,
+        default=None,
+        help="Maximum number of files requested per category (default: %(default)s)"
+    )
+    parser.add_argument(
+        "-o", "--output",
+        type=str,
+        default="bench_download.json",
+        help="File to save the results to (default: %(default)s)"
+    )
+    add_server_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    """Run the download throughput harness and save its results"""
+    args = parse_arguments()
+    config = server_config(args)
+    results = {
+        "server": asdict(config),
+        "requests_per_second": args.requests_per_second,
+        "workers": run_download_benchmark(args.data_dir, args.workers, config,
+                                          args.requests_per_second, args.limit),
+    }
+    with open(args.output, "w", encoding="utf-8") as outfile:
+        json.dump(results, outfile, indent=4)
+    print(f"Results saved to '{args.output}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import argparse
+import hashlib
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, fields
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from urllib.parse import unquote, urlsplit
+
+from iaea.orbs import HelpFormatter
+from iaea.orbs.utils import add_listen_arguments
+from iaea.orbs.utils import serve_until_interrupted
+
+
+@dataclass
+class MockServerConfig:
+    """Latency, failures and rate limit the mock server injects into its responses"""
+    latency: float = 0.0               # Seconds added to every response
+    jitter: float = 0.0                # Random extra latency, up to this many seconds
+    missing_fraction: float = 0.0      # Share of the existing files answered with 404
+    wrong_type_fraction: float = 0.0   # Share of the files served as text/html
+    rate_limit: float = 0.0            # Requests per second before answering 429, 0 disables it
+    retry_after: int = 1               # Retry-After seconds of the 429 responses
+    seed: int = 0                      # Seed of the per-file choices, stable across runs
+
+
+class _TokenBucket:
+    """Thread-safe token bucket holding one second of requests"""
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._tokens = rate
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        """Take a token for one request, False when the bucket is empty"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class _OrbsHandler(BaseHTTPRequestHandler):
+    server: "MockOrbsServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *_args) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes = b"", headers: Optional[dict] = None) -> None:
+        self.server.count(status)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Serve a station file like the ORBS site, or one of the configured failures"""
+        config = self.server.config
+        if config.latency or config.jitter:
+            time.sleep(config.latency + self.server.random_jitter())
+
+        if self.server.bucket and not self.server.bucket.take():
+            self._send(429, b"Too Many Requests", {"Retry-After": str(config.retry_after)})
+            return
+
+        relative = unquote(urlsplit(self.path).path).lstrip("/")
+        path = (self.server.data_dir / relative).resolve()
+        if self.server.data_dir not in path.parents or not path.is_file():
+            self._send(404, b"Not Found", {"Content-Type": "text/html"})
+            return
+
+        draw = random.Random(f"{config.seed}/{relative}").random()
+        if draw < config.missing_fraction:
+            self._send(404, b"Not Found", {"Content-Type": "text/html"})
+            return
+        if draw < config.missing_fraction + config.wrong_type_fraction:
+            self._send(200, b"<html><body>Maintenance</body></html>",
+                       {"Content-Type": "text/html; charset=utf-8"})
+            return
+
+        content = path.read_bytes()
+        etag = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(path.stat().st_mtime, usegmt=True),
+        }
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, headers=headers)
+            return
+        self._send(200, content, {**headers, "Content-Type": "text/csv"})
+
+    do_HEAD = do_GET
+
+
+class MockOrbsServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the ORBS download site, serving the files of a download
+    directory (category/file.csv) with configurable latency and failures
+
+    Every choice about a file (404 gap or wrong content type) depends only on
+    its path and the seed, so that repeated runs see the same gaps
+    """
+    daemon_threads = True
+
+    def __init__(self, data_dir: str, config: Optional[MockServerConfig] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _OrbsHandler)
+        self.data_dir = Path(data_dir).resolve()
+        self.config = config or MockServerConfig()
+        self.bucket = _TokenBucket(self.config.rate_limit) if self.config.rate_limit > 0 else None
+        # Number of responses per HTTP status
+        self.responses: Counter = Counter()
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL to download from"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle_error(self, request, client_address) -> None:
+        """Ignore clients closing their keep-alive connections, report anything else"""
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count(self, status: int) -> None:
+        """Count a response by status code"""
+        with self._lock:
+            self.responses[status] += 1
+
+    def random_jitter(self) -> float:
+        """Random extra latency of a response, in seconds"""
+        with self._lock:
+            return self._random.uniform(0, self.config.jitter)
+
+    def __enter__(self) -> "MockOrbsServer":
+        """Serve from a background thread until the block exits"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+        self._thread.join()
+        self.server_close()
+
+
+def parse_arguments():
+    """
+    Parse command-line arguments for the mock ORBS server
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m iaea.orbs.bench.mock_server",
+        description="Local stand-in for the ORBS download site, "
+                    "for use with generate-data download --base_url",
+        formatter_class=HelpFormatter
+    )
+    add_listen_arguments(parser, 8000)
+    add_server_arguments(parser)
+    return parser.parse_args()
+
+
+def add_server_arguments(parser) -> None:
+    """Directory served by the mock server, and one argument per MockServerConfig field"""
+    parser.add_argument(
+        "-d", "--data_dir",
+        type=str,
+        default="downloaded_CSVs",
+        help="Download directory whose files the mock server serves (default: %(default)s)"
+    )
+    defaults = MockServerConfig()
+    for field in fields(MockServerConfig):
+        parser.add_argument(
+            f"--{field.name}",
+            type=type(getattr(defaults, field.name)),
+            default=getattr(defaults, field.name),
+            help=f"Mock server: {field.name.replace('_', ' ')} (default: %(default)s)"
+        )
+
+
+def server_config(args) -> MockServerConfig:
+    """Mock server configuration of parsed arguments, see add_server_arguments"""
+    return MockServerConfig(**{field.name: getattr(args, field.name)
+                               for field in fields(MockServerConfig)})
+
+
+def main():
+    """Serve a download directory until interrupted"""
+    args = parse_arguments()
+    server = MockOrbsServer(args.data_dir, server_config(args), args.host, args.port)
+    print(f"Serving '{args.data_dir}' at {server.url}")
+    try:
+        serve_until_interrupted(server)
+    finally:
+        print(f"Responses: {dict(server.responses)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import json
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+from datetime import datetime, timezone
+from os.path import join
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from iaea.orbs.bench.synthetic import SyntheticConfig
+from iaea.orbs.bench.synthetic import generate_dataset
+from iaea.orbs.process.download_orbs import DATASETS
+from iaea.orbs.process.generate_csv import FISH_SEAWEED_COLUMNS
+from iaea.orbs.process.generate_csv import SEAWATER_COLUMNS
+from iaea.orbs.process.generate_csv import extract_fish_and_seaweed_measurements
+from iaea.orbs.process.generate_csv import extract_seawater_measurements
+from iaea.orbs.process.generate_csv import save_flat_measurements
+from iaea.orbs.process.generate_json import STATIONS_POINTS
+from iaea.orbs.process.generate_json import DataProcessor
+from iaea.orbs.process.generate_json import parse_column_value
+from iaea.orbs.utils import generate_output_path
+from iaea.orbs.utils import load_json_data
+from iaea.orbs.utils import parse_dms_coordinates
+
+
+def measure(func: Callable[[], Any], repeat: int = 5,
+            setup: Optional[Callable[[], Any]] = None) -> Dict[str, float]:
+    """
+    Time a stage over several runs, then run it once more under tracemalloc
+    for its peak Python memory, which tracing would otherwise slow down
+
+    setup, when given, prepares a fresh argument for each run outside the timing
+    """
+    times = []
+    for _ in range(repeat):
+        args = (setup(),) if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+
+    args = (setup(),) if setup else ()
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "repeat": repeat,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "peak_mib": peak / 2 ** 20,
+    }
+
+
+class BenchmarkSuite:
+    """
+    Benchmarks of the processing stages on a synthetic ORBS dataset
+    """
+    def __init__(self, data_dir: str, registry: str, work_dir: str):
+        self.data_dir = data_dir
+        self.registry = registry
+        self.work_dir = work_dir
+        self.stages: Dict[str, Callable[[int], Dict[str, float]]] = {
+            "parse_column_value": self.bench_parse_column_value,
+            "update_dataframe": self.bench_update_dataframe,
+            "process_seawater_data": self.bench_process_seawater_data,
+            "find_matching_station": self.bench_find_matching_station,
+            "process_station[Seawater]":
+                lambda repeat: self.bench_process_station("Seawater", repeat),
+            "process_station[Fish]":
+                lambda repeat: self.bench_process_station("Fish", repeat),
+            "process_station[Seaweed]":
+                lambda repeat: self.bench_process_station("Seaweed", repeat),
+            "extract_seawater_measurements": self.bench_extract_seawater,
+            "extract_fish_and_seaweed_measurements": self.bench_extract_fish,
+            "save_flat_measurements": self.bench_save_flat_measurements,
+        }
+
+    def _processor(self) -> DataProcessor:
+        return DataProcessor(self.registry, self.data_dir, self.work_dir)
+
+    def _sample_dir(self, sample_type: str) -> str:
+        return join(self.data_dir, DATASETS[sample_type][0])
+
+    def _fish_frame(self) -> pd.DataFrame:
+        directory = self._sample_dir("Fish")
+        files = DataProcessor.build_file_index(directory)
+        return pd.concat(
+            [pd.read_csv(entry.path, skiprows=2)
+             for entries in files.values() for entry in entries],
+            ignore_index=True
+        )
+
+    def bench_parse_column_value(self, repeat: int) -> Dict[str, float]:
+        """Parse every Dt and ND cell of the Fish files one by one"""
+        frame = self._fish_frame()
+        cells = frame["Dt"].tolist() + frame["ND"].tolist()
+        return measure(lambda: [parse_column_value(cell) for cell in cells], repeat)
+
+    def bench_update_dataframe(self, repeat: int) -> Dict[str, float]:
+        """Split the Fish value columns into values and uncertainties"""
+        frame = self._fish_frame()
+        processor = self._processor()
+        return measure(processor.update_fish_seaweed_dataframe, repeat, setup=frame.copy)
+
+    def bench_process_seawater_data(self, repeat: int) -> Dict[str, float]:
+        """Parse the lines of every Seawater file"""
+        directory = self._sample_dir("Seawater")
+        files = [entry.name for entries in DataProcessor.build_file_index(directory).values()
+                 for entry in entries]
+        contents = [DataProcessor.get_lines(directory, name) for name in files]
+        processor = self._processor()
+        return measure(lambda: [processor.process_seawater_data(lines) for lines in contents],
+                       repeat)
+
+    def bench_find_matching_station(self, repeat: int) -> Dict[str, float]:
+        """Look up the station name of every registered station by its coordinates"""
+        queries = []
+        for stations in load_json_data(self.registry).values():
+            for station in stations:
+                lat, lon = parse_dms_coordinates(station["coordinates"])
+                queries.append((float(lon), float(lat), station["org"]))
+        return measure(
+            lambda: [DataProcessor.find_matching_station(lon, lat, org, STATIONS_POINTS)
+                     for lon, lat, org in queries],
+            repeat
+        )
+
+    def bench_process_station(self, sample_type: str, repeat: int) -> Dict[str, float]:
+        """Process every station of a sample type into its JSON output"""
+        directory = self._sample_dir(sample_type)
+        # A new processor per run, so that its station-name memo starts empty
+        return measure(
+            lambda processor: processor.process_station(sample_type, directory),
+            repeat, setup=self._processor
+        )
+
+    def _stations(self, sample_type: str) -> List[dict]:
+        processor = self._processor()
+        processor.process_station(sample_type, self._sample_dir(sample_type))
+        return load_json_data(generate_output_path(self.work_dir, sample_type, "json"))
+
+    def bench_extract_seawater(self, repeat: int) -> Dict[str, float]:
+        """Flatten the Seawater JSON stations into the CSV output"""
+        stations = self._stations("Seawater")
+        output = join(self.work_dir, "seawater_data.csv")
+        return measure(lambda: extract_seawater_measurements(stations, output), repeat)
+
+    def bench_extract_fish(self, repeat: int) -> Dict[str, float]:
+        """Flatten the Fish JSON stations into the CSV output"""
+        stations = self._stations("Fish")
+        output = join(self.work_dir, "fish_data.csv")
+        return measure(lambda: extract_fish_and_seaweed_measurements(stations, output), repeat)
+
+    def bench_save_flat_measurements(self, repeat: int) -> Dict[str, float]:
+        """Write the flat measurement tables of every sample type to CSV"""
+        tables = {
+            sample_type: self._processor().process_station(sample_type,
+                                                           self._sample_dir(sample_type))
+            for sample_type in DATASETS
+        }
+
+        def save():
+            for sample_type, table in tables.items():
+                columns = SEAWATER_COLUMNS if sample_type == "Seawater" else FISH_SEAWEED_COLUMNS
+                save_flat_measurements(table, columns, join(self.work_dir, f"{sample_type}.csv"))
+        return measure(save, repeat)
+
+    def run(self, repeat: int = 5, stages: Optional[List[str]] = None) -> Dict[str, dict]:
+        """Run the selected stages, all of them by default"""
+        results = {}
+        for name, bench in self.stages.items():
+            if stages and name not in stages:
+                continue
+            results[name] = bench(repeat)
+            print(f"{name:<40} {results[name]['median_s']:>10.4f} s "
+                  f"{results[name]['peak_mib']:>10.2f} MiB")
+        return results
+
+
+def run_benchmarks(config: SyntheticConfig, repeat: int = 5,
+                   stages: Optional[List[str]] = None) -> dict:
+    """Generate a synthetic dataset and benchmark every stage on it"""
+    with tempfile.TemporaryDirectory(prefix="orbs-bench-") as work_dir:
+        data_dir, registry = generate_dataset(work_dir, config)
+        results = BenchmarkSuite(data_dir, registry, work_dir).run(repeat, stages)
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "config": asdict(config),
+        "stages": results,
+    }
+
+
+def save_results(results: dict, path: str) -> None:
+    """Save benchmark results to a JSON file"""
+    with open(path, "w", encoding="utf-8") as outfile:
+        json.dump(results, outfile, indent=4)
+
+
+def compare_results(current: dict, baseline: dict, threshold: float = 0.1) -> List[dict]:
+    """
+    Compare the median time and peak memory of the stages found in both results.
+    A stage regresses when either grows by more than the threshold fraction
+    """
+    if current.get("config") != baseline.get("config"):
+        print("Warning: the baseline was run on a different synthetic dataset")
+
+    rows = []
+    for name, stage in current["stages"].items():
+        base = baseline["stages"].get(name)
+        if base is None:
+            continue
+        time_ratio = stage["median_s"] / base["median_s"] if base["median_s"] else float("inf")
+        memory_ratio = stage["peak_mib"] / base["peak_mib"] if base["peak_mib"] else 1.0
+        rows.append({
+            "stage": name,
+            "time_ratio": time_ratio,
+            "memory_ratio": memory_ratio,
+            "regression": time_ratio > 1 + threshold or memory_ratio > 1 + threshold,
+        })
+    return rows
+
+
+def print_comparison(rows: List[dict]) -> None:
+    """Print a comparison table, ratios below 1 being improvements"""
+    print(f"{'stage':<40} {'time':>8} {'memory':>8}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['stage']:<40} {row['time_ratio']:>7.2f}x {row['memory_ratio']:>7.2f}x{flag}")
@@ -0,0 +1,171 @@
+import json
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+from iaea.orbs.process.download_orbs import DATASETS
+from iaea.orbs.utils import package_file
+
+
+REFERENCE_POINTS = package_file("stations/station_points.csv")
+
+SEAWATER_DEPTHS = ["Sea surface to a depth of 0.5 m", "2 to 3 m above seabed"]
+SEAWATER_NUCLIDES = ["Cs-134", "Cs-137", "H-3"]
+FISH_SAMPLES = ["Olive flounder", "Bluefin searobin", "Mixed fish sample", "Pacific cod"]
+SEAWEED_SAMPLES = ["Gulf weed", "Sea lettuce", "Arame"]
+FISH_NUCLIDES = [("Cs-134", "Bq/kg-fresh"), ("Cs-137", "Bq/kg-fresh"),
+                 ("H-3:TFWT", "Bq/L-water"), ("H-3:OBT", "Bq/kg-fresh")]
+ORGS = ["TEPCO", "MOE", "NRA", "FPG"]
+
+
+@dataclass
+class SyntheticConfig:
+    """Size and seed of a synthetic ORBS dataset"""
+    seawater_stations: int = 60  # Number of Seawater station files
+    fish_stations: int = 20      # Number of Fish station files
+    seaweed_stations: int = 5    # Number of Seaweed station files
+    rows: int = 300              # Measurement rows per file
+    depths: int = 2              # Depth column groups per Seawater file
+    seed: int = 0                # Random seed, the same config always gives the same files
+
+
+def to_dms(value: float, positive: str, negative: str) -> str:
+    """Format decimal degrees the way the station registry writes coordinates"""
+    hemisphere = positive if value >= 0 else negative
+    value = abs(value)
+    degrees = int(value)
+    minutes = int((value - degrees) * 60)
+    seconds = (value - degrees - minutes / 60) * 3600
+    return f"{degrees}°{minutes:02d}′{seconds:05.2f}″{hemisphere}"
+
+
+class SyntheticOrbs:
+    """
+    Writer of ORBS-format station files and of the matching station registry
+
+    Seawater files have the multi-row depth / nuclide / Dt-ND headers, Fish and
+    Seaweed files the flat layout. Cells mix plain values, '±' uncertainties,
+    '%' suffixes, '-' placeholders and blanks. Half of the stations are unnamed and sit on
+    reference station points, so that station-name lookups are exercised.
+    """
+    def __init__(self, config: SyntheticConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.reference = pd.read_csv(REFERENCE_POINTS)
+
+    def _value(self, scale: float) -> str:
+        draw = self.random.random()
+        if draw < 0.35:
+            return ""
+        if draw < 0.45:
+            return "-"
+        value = f"{self.random.uniform(0.1, 10) * scale:.2g}"
+        if draw < 0.55:
+            return f"{value}±{self.random.uniform(0.01, 1) * scale:.2g}"
+        if draw < 0.57:
+            return f"{value}%"
+        return value
+
+    def _dates(self) -> List[str]:
+        start = datetime(2021, 1, 1)
+        minutes = sorted((self.random.randrange(2000 * 24 * 60) for _ in range(self.config.rows)),
+                         reverse=True)
+        dates = (start + timedelta(minutes=minute) for minute in minutes)
+        return [f"{date.year}/{date.month}/{date.day} {date.hour}:{date.minute:02d}"
+                for date in dates]
+
+    def _station(self, station_id: int) -> dict:
+        if self.random.random() < 0.5:
+            org = self.random.choice(ORGS)
+            name = f"S-{station_id}"
+            lat, lon = self.random.uniform(37, 38.5), self.random.uniform(140.9, 142)
+        else:
+            point = self.reference.iloc[self.random.randrange(len(self.reference))]
+            org, name, lat, lon = point["org"], "", point["lat"], point["lon"]
+        return {
+            "id": station_id,
+            "org": org,
+            "station": name,
+            "coordinates": f"{to_dms(lat, 'N', 'S')}/{to_dms(lon, 'E', 'W')}",
+        }
+
+    @staticmethod
+    def _preamble(location: str) -> List[str]:
+        return ["\ufeffFile Creation Date,2026-08-21", f"Sampling Location,{location}", ""]
+
+    def seawater_lines(self) -> List[str]:
+        """Lines of one Seawater file"""
+        depths = self.config.depths
+        width = 1 + 2 * len(SEAWATER_NUCLIDES)
+        depth_names = [SEAWATER_DEPTHS[i] if i < len(SEAWATER_DEPTHS) else f"{i * 50}m"
+                       for i in range(depths)]
+        nuclide_cells = [""] + [cell for nuclide in SEAWATER_NUCLIDES for cell in (nuclide, "")]
+        lines = self._preamble("Synthetic station")
+        lines.append(",".join(name + "," * (width - 1) for name in depth_names))
+        lines.append(",".join(nuclide_cells * depths))
+        lines.append(",".join(
+            "Date and time of Sampling," + ",".join(["Dt,ND"] * len(SEAWATER_NUCLIDES))
+            for _ in range(depths)
+        ))
+        for date in self._dates():
+            cells = []
+            for _ in range(depths):
+                cells.append(date)
+                cells.extend(self._value(0.01) for _ in range(2 * len(SEAWATER_NUCLIDES)))
+            lines.append(",".join(cells))
+        return lines
+
+    def fish_lines(self, samples: List[str]) -> List[str]:
+        """Lines of one Fish or Seaweed file"""
+        lines = self._preamble("")
+        lines.append("Date and time of Sampling,Sample,Radionuclide,Dt,ND,Unit")
+        for date in self._dates():
+            nuclide, unit = self.random.choice(FISH_NUCLIDES)
+            lines.append(",".join([
+                date.split(" ")[0], self.random.choice(samples), nuclide,
+                self._value(1), self._value(1), unit
+            ]))
+        return lines
+
+    def write(self, output_dir: str) -> Tuple[str, str]:
+        """
+        Write the station files in the download directory layout and the station
+        registry, returning the data directory and the registry path
+        """
+        data_dir = Path(output_dir) / "downloaded_CSVs"
+        counts = {
+            "Seawater": self.config.seawater_stations,
+            "Fish": self.config.fish_stations,
+            "Seaweed": self.config.seaweed_stations,
+        }
+        registry = {}
+        station_id = 1
+        for sample_type, count in counts.items():
+            category, prefix = DATASETS[sample_type]
+            (data_dir / category).mkdir(parents=True, exist_ok=True)
+            registry[sample_type] = []
+            for _ in range(count):
+                registry[sample_type].append(self._station(station_id))
+                if sample_type == "Seawater":
+                    lines = self.seawater_lines()
+                else:
+                    samples = FISH_SAMPLES if sample_type == "Fish" else SEAWEED_SAMPLES
+                    lines = self.fish_lines(samples)
+                (data_dir / category / f"{prefix}{station_id}.csv").write_text(
+                    "\n".join(lines) + "\n", encoding="utf8")
+                station_id += 1
+
+        registry_path = Path(output_dir) / "station_by_id.json"
+        with open(registry_path, "w", encoding="utf-8") as outfile:
+            json.dump(registry, outfile, indent=4, ensure_ascii=False)
+        return str(data_dir), str(registry_path)
+
+
+def generate_dataset(output_dir: str,
+                     config: Optional[SyntheticConfig] = None) -> Tuple[str, str]:
+    """Write a synthetic ORBS dataset, see SyntheticOrbs"""
+    return SyntheticOrbs(config or SyntheticConfig()).write(output_dir)
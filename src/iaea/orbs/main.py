@@ -1,44 +1,160 @@
-
+# Stage modules are imported by the commands that use them, so that `--help`
+# and single-stage runs do not pay for pandas, numpy or requests
+# pylint: disable=import-outside-toplevel
 import argparse
+import sys
+from datetime import datetime, timezone
 from os.path import join
-from pkg_resources import resource_filename
 
 from iaea.orbs import logger
 from iaea.orbs import HelpFormatter
+from iaea.orbs.metrics import metrics
 
-from iaea.orbs.process.download_orbs import DownloadConfig
-from iaea.orbs.process.download_orbs import download_dataset
-from iaea.orbs.process.generate_json import DataProcessor
-from iaea.orbs.process.generate_csv import extract_fish_and_seaweed_measurements
-from iaea.orbs.process.generate_csv import extract_seawater_measurements
+from iaea.orbs.process.json_writer import JSON_LAYOUTS
+from iaea.orbs.utils import COMPRESSIONS
+from iaea.orbs.utils import add_listen_arguments
+from iaea.orbs.utils import compressed_path
 from iaea.orbs.utils import generate_output_path
 from iaea.orbs.utils import load_json_data
+from iaea.orbs.utils import package_file
+from iaea.orbs.utils import require_compression
+from iaea.orbs.utils import serve_until_interrupted
 
 
-STATIONS_INFO = resource_filename(
-    "iaea.orbs", "stations/station_by_id.json" )
+STATIONS_INFO = package_file("stations/station_by_id.json")
 
 FISH_KEY = "Fish"
 SEAWATER_KEY = "Seawater"
 SEAWEED_KEY = "Seaweed"
 
+OUTPUT_FORMATS = ("json", "csv", "parquet", "sqlite", "rollups", "changes")
+EXPORT_FORMATS = ("csv", "parquet", "sqlite", "rollups", "changes")
+COMMANDS = ("download", "process", "export", "all", "query", "serve")
+SQLITE_DB = "stations/transformed/orbs.sqlite"
+ROLLUPS_DB = "stations/transformed/rollups.sqlite"
+ORBS_URL = "https://www.monitororbs.jp/en/download"
+# Arguments that do not change the outputs, free to differ when resuming a run
+RUN_SETTINGS = (
+    "command", "handler", "resume", "journal", "metrics_dir", "profile",
+    "max_workers", "requests_per_second", "process_workers", "pipeline", "queue_size",
+)
 
-def parse_arguments():
-    """
-    Parse command-line arguments for ORBS data processing
-    """
-    parser = argparse.ArgumentParser(
-        description="ORBS Data Extraction Tool",
-        formatter_class=HelpFormatter
-    )
 
+def add_common_arguments(parser, journal=True):
+    """Arguments shared by every command, the journal ones by those that can be resumed"""
     parser.add_argument(
-        "-d", "--download_dir", 
+        "-d", "--download_dir",
         type=str,
         default="downloaded_CSVs",
         help="Directory to download CSV files (default: %(default)s)"
     )
 
+    parser.add_argument(
+        "--metrics_dir",
+        type=str,
+        default="metrics",
+        help="Directory receiving one JSON metrics file per run (default: %(default)s)"
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Save a cProfile file per stage beside the run's metrics file"
+    )
+
+    if not journal:
+        return
+
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the interrupted run of the same command and options from its journal"
+    )
+
+    parser.add_argument(
+        "--journal",
+        type=str,
+        default=None,
+        help="Run journal file, kept beside the download directory when not given "
+             "(default: %(default)s)"
+    )
+
+
+def add_download_arguments(parser):
+    """Arguments of the download stage"""
+    parser.add_argument(
+        "-u", "--base_url",
+        type=str,
+        default=ORBS_URL,
+        help="Download site, e.g. a local mock server (default: %(default)s)"
+    )
+
+    parser.add_argument(
+        "-w", "--max_workers",
+        type=int,
+        default=4,
+        help="Number of concurrent download workers (default: %(default)s)"
+    )
+
+    parser.add_argument(
+        "-r", "--requests_per_second",
+        type=float,
+        default=2.0,
+        help="Global download request budget, 0 disables it (default: %(default)s)"
+    )
+
+    parser.add_argument(
+        "-m", "--manifest",
+        type=str,
+        default=None,
+        help="Download manifest file, kept beside the download directory when not given "
+             "(default: %(default)s)"
+    )
+
+    parser.add_argument(
+        "--missing_recheck_days",
+        type=float,
+        default=7.0,
+        help="Days before a known missing file is requested again (default: %(default)s)"
+    )
+
+    parser.add_argument(
+        "-p", "--probe_beyond",
+        type=int,
+        default=20,
+        help="File numbers probed beyond the highest known one to find new stations, "
+             "files found by a probe being known to the next runs, which probe past them "
+             "(default: %(default)s)"
+    )
+
+
+def add_parse_arguments(parser):
+    """Arguments of the parsing of the downloaded files"""
+    parser.add_argument(
+        "--process_workers",
+        type=int,
+        default=1,
+        help="Number of worker processes parsing stations, 1 runs in-process "
+             "(default: %(default)s)"
+    )
+
+    parser.add_argument(
+        "--parse_cache",
+        type=str,
+        default=None,
+        help="Directory caching parsed station files between runs, kept beside the download "
+             "directory when not given (default: %(default)s)"
+    )
+
+    parser.add_argument(
+        "--no_parse_cache",
+        action="store_true",
+        help="Parse every station file again instead of using the parse cache"
+    )
+
+
+def add_json_arguments(parser):
+    """Arguments of the JSON output"""
     parser.add_argument(
         "-json", "--transform_json_dir",
         type=str,
@@ -46,6 +162,42 @@ def parse_arguments():
         help="Directory to save transformed JSON files (default: %(default)s)"
     )
 
+    parser.add_argument(
+        "--json_layout",
+        choices=JSON_LAYOUTS,
+        default="json",
+        help="Layout of the transformed JSON files: an array of stations, or NDJSON with "
+             "one station or one measurement per line (default: %(default)s)"
+    )
+
+    parser.add_argument(
+        "--compact_json",
+        action="store_true",
+        help="Write the 'json' layout without indentation or spaces"
+    )
+
+
+def add_compression_arguments(parser):
+    """Arguments of the compression of the JSON and CSV outputs"""
+    parser.add_argument(
+        "--compression",
+        choices=tuple(COMPRESSIONS),
+        default="none",
+        help="Compression of the JSON and CSV files, adding a .gz or .zst extension, "
+             "zstd requires zstandard (default: %(default)s)"
+    )
+
+    parser.add_argument(
+        "--compression_level",
+        type=int,
+        default=None,
+        help="Compression level, 1-9 for gzip and 1-22 for zstd, their usual default "
+             "when not given (default: %(default)s)"
+    )
+
+
+def add_export_arguments(parser, formats, default_formats):
+    """Arguments of the CSV and Parquet outputs"""
     parser.add_argument(
         "-csv", "--transform_csv_dir",
         type=str,
@@ -53,68 +205,500 @@ def parse_arguments():
         help="Directory to save transformed CSV files (default: %(default)s)"
     )
 
-    return parser.parse_args()
+    parser.add_argument(
+        "-parquet", "--transform_parquet_dir",
+        type=str,
+        default="stations/transformed/parquet",
+        help="Directory to save the partitioned Parquet datasets (default: %(default)s)"
+    )
+
+    parser.add_argument(
+        "--sqlite_db",
+        type=str,
+        default=SQLITE_DB,
+        help="SQLite measurement database to create (default: %(default)s)"
+    )
+
+    parser.add_argument(
+        "--rollups_db",
+        type=str,
+        default=ROLLUPS_DB,
+        help="SQLite database of the monthly and yearly rollups, updated in place "
+             "(default: %(default)s)"
+    )
 
+    parser.add_argument(
+        "--changes_dir",
+        type=str,
+        default="stations/transformed/changes",
+        help="Directory receiving one NDJSON delta file per run with the inserted, updated "
+             "and removed measurements (default: %(default)s)"
+    )
 
-def main():
-    """Main function that orchestrates the data processing"""
-    args = parse_arguments()   
-    base_url = "https://www.monitororbs.jp/en/download"
-
-    configs = [
-        DownloadConfig(
-            category="Seawater",
-            prefix="Seawater_10_",
-            start_num=1,
-            end_num=400,
-            min_delay=1,
-            max_delay=5
-        ),
-        DownloadConfig(
-            category="Fishes",
-            prefix="Fishes_20_",
-            start_num=256,
-            end_num=400,
-            min_delay=1,
-            max_delay=5
-        ),
-        DownloadConfig(
-            category="Seaweeds",
-            prefix="Seaweeds_30_",
-            start_num=359,
-            end_num=400,
-            min_delay=1,
-            max_delay=5
-        )
-    ]
+    parser.add_argument(
+        "-f", "--formats",
+        nargs="+",
+        choices=formats,
+        default=default_formats,
+        help="Output formats to write, Parquet requires pyarrow (default: %(default)s)"
+    )
 
-    # Download each dataset
+
+def add_query_arguments(parser):
+    """Arguments of the measurement store query"""
+    parser.add_argument(
+        "--sqlite_db",
+        type=str,
+        default=SQLITE_DB,
+        help="SQLite measurement database to query (default: %(default)s)"
+    )
+    parser.add_argument("--sample_type", choices=(SEAWATER_KEY, FISH_KEY, SEAWEED_KEY),
+                        help="Sample type (default: %(default)s)")
+    parser.add_argument("--id", type=int, dest="station_id",
+                        help="Station ID of the registry (default: %(default)s)")
+    parser.add_argument("--station", type=str, help="Station name, e.g. T-1 (default: %(default)s)")
+    parser.add_argument("--org", type=str, help="Organization, e.g. TEPCO (default: %(default)s)")
+    parser.add_argument("--nuclide", type=str,
+                        help="Radionuclide, e.g. Cs-137 or H-3:TFWT (default: %(default)s)")
+    parser.add_argument("--depth", type=str,
+                        help="Seawater depth, e.g. Surface or Bottom (default: %(default)s)")
+    parser.add_argument("--since", type=str,
+                        help="First sampling date, e.g. 2023-01-01 (default: %(default)s)")
+    parser.add_argument("--before", type=str,
+                        help="Sampling dates strictly before, e.g. 2024-01-01 "
+                             "(default: %(default)s)")
+    parser.add_argument("--limit", type=int, help="Maximum number of rows (default: %(default)s)")
+    parser.add_argument(
+        "--output_format",
+        choices=("csv", "ndjson"),
+        default="csv",
+        help="Format of the rows written to standard output (default: %(default)s)"
+    )
+
+
+def add_pipeline_arguments(parser):
+    """Arguments overlapping the download and the processing"""
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Parse each station as soon as its file is downloaded instead of after the download"
+    )
+    parser.add_argument(
+        "--queue_size",
+        type=int,
+        default=64,
+        help="Downloaded files waiting to be parsed before the downloads pause, with --pipeline "
+             "(default: %(default)s)"
+    )
+
+
+def add_serve_arguments(parser):
+    """Arguments of the query endpoint"""
+    add_listen_arguments(parser, 8080)
+    parser.add_argument(
+        "--refresh_interval",
+        type=float,
+        default=3600.0,
+        help="Seconds between two refreshes of the in-memory snapshot, 0 disables them "
+             "(default: %(default)s)"
+    )
+    parser.add_argument(
+        "--refresh_download",
+        action="store_true",
+        help="Download new and changed station files before each refresh"
+    )
+
+
+def parse_arguments(argv=None):
+    """
+    Parse command-line arguments for ORBS data processing
+
+    Without a command, all the stages run, as they did before commands existed
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in COMMANDS + ("-h", "--help"):
+        argv = ["all"] + argv
+
+    parser = argparse.ArgumentParser(
+        prog="generate-data",
+        description="ORBS Data Extraction Tool",
+        formatter_class=HelpFormatter
+    )
+    commands = parser.add_subparsers(
+        title="commands", dest="command", metavar="{download,process,export,all,query,serve}",
+        help="Stage to run, 'all' when not given"
+    )
+
+    download = commands.add_parser(
+        "download", help="Download the station CSV files from ORBS",
+        formatter_class=HelpFormatter)
+    add_common_arguments(download)
+    add_download_arguments(download)
+    download.set_defaults(handler=run_download)
+
+    process = commands.add_parser(
+        "process", help="Parse the downloaded files into the JSON output",
+        formatter_class=HelpFormatter)
+    add_common_arguments(process)
+    add_parse_arguments(process)
+    add_json_arguments(process)
+    add_compression_arguments(process)
+    process.set_defaults(handler=run_process)
+
+    export = commands.add_parser(
+        "export", help="Parse the downloaded files into the CSV and Parquet outputs",
+        formatter_class=HelpFormatter)
+    add_common_arguments(export)
+    add_parse_arguments(export)
+    add_export_arguments(export, EXPORT_FORMATS, ["csv"])
+    add_compression_arguments(export)
+    export.set_defaults(handler=run_export)
+
+    run_all = commands.add_parser(
+        "all", help="Download, process and export",
+        formatter_class=HelpFormatter)
+    add_common_arguments(run_all)
+    add_download_arguments(run_all)
+    add_parse_arguments(run_all)
+    add_json_arguments(run_all)
+    add_export_arguments(run_all, OUTPUT_FORMATS, ["json", "csv"])
+    add_compression_arguments(run_all)
+    add_pipeline_arguments(run_all)
+    run_all.set_defaults(handler=run_everything)
+
+    query = commands.add_parser(
+        "query", help="Query the SQLite measurement store written by the 'sqlite' format",
+        formatter_class=HelpFormatter)
+    add_query_arguments(query)
+    query.set_defaults(handler=run_query)
+
+    serve = commands.add_parser(
+        "serve", help="Answer measurement queries over HTTP from an in-memory snapshot, "
+                      "refreshed in the background",
+        formatter_class=HelpFormatter)
+    add_common_arguments(serve, journal=False)
+    add_download_arguments(serve)
+    add_parse_arguments(serve)
+    add_serve_arguments(serve)
+    serve.set_defaults(handler=run_serve)
+
+    return parser.parse_args(argv)
+
+
+def stage_done(args, name):
+    """Whether the interrupted run being resumed completed the stage"""
+    journal = getattr(args, "run_journal", None)
+    if journal is None or not journal.stage_done(name):
+        return False
+    logger.info("Skipping stage '%s', completed by the interrupted run", name)
+    return True
+
+
+def complete_stage(args, name):
+    """Checkpoint a completed stage in the run journal"""
+    journal = getattr(args, "run_journal", None)
+    if journal is not None:
+        journal.complete_stage(name)
+
+
+def run_download(args, on_file=None):
+    """
+    Download each dataset, sharing one request budget across all of them,
+    calling on_file with the path of each file settled, see download_dataset
+    """
+    from iaea.orbs.process.download_orbs import RateLimiter
+    from iaea.orbs.process.download_orbs import build_download_configs
+    from iaea.orbs.process.download_orbs import download_dataset
+    from iaea.orbs.process.manifest import DownloadManifest
+
+    base_url = args.base_url.rstrip("/")
+    manifest = DownloadManifest(
+        args.manifest or DownloadManifest.default_path(args.download_dir),
+        args.missing_recheck_days
+    )
+    configs = build_download_configs(
+        load_json_data(STATIONS_INFO),
+        args.download_dir,
+        manifest,
+        probe_beyond=args.probe_beyond,
+        max_workers=args.max_workers,
+        requests_per_second=args.requests_per_second
+    )
+
+    rate_limiter = RateLimiter(args.requests_per_second)
     for config in configs:
-        logger.info("Starting download of %s dataset from number %d to %d",
-                config.category, config.start_num, config.end_num)
-        download_dataset(base_url, config, args.download_dir)
+        stage = f"download.{config.category}"
+        if stage_done(args, stage):
+            continue
+        logger.info("Starting download of %s dataset: %d files",
+                config.category, len(config.file_nums))
+        with metrics.stage(stage):
+            download_dataset(base_url, config, args.download_dir, rate_limiter, manifest,
+                             getattr(args, "run_journal", None), on_file)
+        complete_stage(args, stage)
         logger.info("Completed download of %s dataset", config.category)
 
-    # save json files
-    processor = DataProcessor(STATIONS_INFO, args.download_dir, args.transform_json_dir)
-    processor.process_all_data()
-    logger.info("Full data JSON file saved to '%s'", args.transform_json_dir)
-
-    # save csv files
-    def save_csv(sample_type):
-        json_output = generate_output_path(args.transform_json_dir, sample_type, "json")
-        json_data = load_json_data(json_output)
-        csv_output = generate_output_path(args.transform_csv_dir, sample_type, "csv")
-        if sample_type == SEAWATER_KEY:
-            extract_seawater_measurements(json_data, csv_output)
-        else:
-            extract_fish_and_seaweed_measurements(json_data, csv_output)
+
+def build_processor(args, json_dir):
+    """Processor of the downloaded files, writing the JSON output when json_dir is given"""
+    from iaea.orbs.process.generate_json import DataProcessor
+    from iaea.orbs.process.parse_cache import ParseCache
+
+    parse_cache_dir = None if args.no_parse_cache else \
+        args.parse_cache or ParseCache.default_path(args.download_dir)
+    return DataProcessor(STATIONS_INFO, args.download_dir, json_dir,
+                         workers=args.process_workers,
+                         json_layout=getattr(args, "json_layout", "json"),
+                         parse_cache_dir=parse_cache_dir,
+                         compact_json=getattr(args, "compact_json", False),
+                         compression=getattr(args, "compression", "none"),
+                         compresslevel=getattr(args, "compression_level", None))
+
+
+def process_tables(args, json_dir, collect_tables=True):
+    """
+    Parse the downloaded files, writing the JSON output when json_dir is given,
+    and return the flat measurement tables of each sample type, or None without
+    collect_tables
+
+    When resuming a run that already wrote the JSON output, only the tables are
+    rebuilt, from the parse cache
+    """
+    if json_dir and stage_done(args, "process"):
+        json_dir = None
+
+    processor = build_processor(args, json_dir)
+    with metrics.stage("process"):
+        tables = processor.process_all_data(collect_tables)
+    if json_dir:
+        complete_stage(args, "process")
+        logger.info("Full data JSON file saved to '%s'", json_dir)
+    return tables
+
+
+def pipeline_tables(args, json_dir):
+    """
+    Download and parse at once, each station being parsed as soon as its file
+    is downloaded, and return the flat measurement tables like process_tables
+    """
+    from iaea.orbs.process.pipeline import run_pipeline
+
+    if json_dir and stage_done(args, "process"):
+        json_dir = None
+
+    processor = build_processor(args, json_dir)
+    with metrics.stage("pipeline"):
+        tables = run_pipeline(lambda on_file: run_download(args, on_file), processor,
+                              args.queue_size)
+    if json_dir:
+        complete_stage(args, "process")
+        logger.info("Full data JSON file saved to '%s'", json_dir)
+    return tables
+
+
+def export_columns():
+    """Columns of the flat measurement table of each sample type"""
+    from iaea.orbs.process.generate_csv import FISH_SEAWEED_COLUMNS
+    from iaea.orbs.process.generate_csv import SEAWATER_COLUMNS
+
+    return {
+        FISH_KEY: FISH_SEAWEED_COLUMNS,
+        SEAWATER_KEY: SEAWATER_COLUMNS,
+        SEAWEED_KEY: FISH_SEAWEED_COLUMNS,
+    }
+
+
+def export_csv(args, tables):
+    """Save the csv files, from the flat tables kept in memory instead of re-reading the JSON"""
+    from iaea.orbs.process.generate_csv import save_flat_measurements
+
+    columns = export_columns()
+    for sample_type in (FISH_KEY, SEAWATER_KEY, SEAWEED_KEY):
+        csv_output = compressed_path(
+            generate_output_path(args.transform_csv_dir, sample_type, "csv"),
+            args.compression)
+        save_flat_measurements(tables[sample_type], columns[sample_type], csv_output,
+                               args.compression_level)
         logger.info("%s data file saved to '%s'", sample_type, args.transform_csv_dir)
 
 
-    save_csv(FISH_KEY)
-    save_csv(SEAWATER_KEY)
-    save_csv(SEAWEED_KEY)
+def export_parquet(args, tables):
+    """Save the parquet datasets"""
+    from iaea.orbs.process.generate_parquet import save_parquet_datasets
+
+    save_parquet_datasets(tables, export_columns(), args.transform_parquet_dir)
+
+
+def export_sqlite(args, long_tables):
+    """Load the sqlite measurement store"""
+    from iaea.orbs.process.sqlite_store import save_measurement_store
+
+    count = save_measurement_store(long_tables, args.sqlite_db)
+    logger.info("%d measurements saved to '%s'", count, args.sqlite_db)
+
+
+def export_rollups(args, long_tables):
+    """Update the rollups of the buckets whose measurements changed"""
+    from iaea.orbs.process.rollups import update_rollups
+
+    counts = update_rollups(long_tables, args.rollups_db)
+    logger.info("%d month bucket(s) changed, %d rollup row(s) written to '%s'",
+                counts["buckets_changed"], counts["rows_written"], args.rollups_db)
+
+
+def export_changes(args, long_tables):
+    """Append the delta of the measurements since the previous run"""
+    from iaea.orbs.process.change_feed import write_change_feed
+
+    write_change_feed(long_tables, args.changes_dir)
+
+
+# Exporters of the flat measurement tables, and of their long form with one
+# row per measurement and nuclide
+FLAT_EXPORTERS = {"csv": export_csv, "parquet": export_parquet}
+LONG_EXPORTERS = {"sqlite": export_sqlite, "rollups": export_rollups, "changes": export_changes}
+
+
+def export_tables(args, tables):
+    """Write the flat measurement tables in the selected export formats"""
+    pending = [
+        name for name in EXPORT_FORMATS
+        if name in args.formats and not stage_done(args, f"export.{name}")
+    ]
+    # The long tables are shared by the sqlite store, rollups and change feed
+    long_tables = None
+    if set(pending) & set(LONG_EXPORTERS):
+        from iaea.orbs.process.generate_csv import long_measurements
+        long_tables = {
+            sample_type: long_measurements(table) for sample_type, table in tables.items()
+        }
+
+    for name in pending:
+        with metrics.stage(f"export.{name}"):
+            if name in FLAT_EXPORTERS:
+                FLAT_EXPORTERS[name](args, tables)
+            else:
+                LONG_EXPORTERS[name](args, long_tables)
+        complete_stage(args, f"export.{name}")
+
+
+def check_output_dependencies(args):
+    """Fail before any work when an optional dependency of the outputs is missing"""
+    require_compression(args.compression)
+    if "parquet" in getattr(args, "formats", ()):
+        from iaea.orbs.process.generate_parquet import require_pyarrow
+        require_pyarrow()
+
+
+def run_process(args):
+    """Parse the downloaded files into the JSON output"""
+    check_output_dependencies(args)
+    # Only the JSON output is wanted, the tables are not built
+    process_tables(args, args.transform_json_dir, collect_tables=False)
+
+
+def run_export(args):
+    """Parse the downloaded files, using the parse cache, into the export formats"""
+    check_output_dependencies(args)
+    export_tables(args, process_tables(args, None))
+
+
+def run_everything(args):
+    """Download, process and export, as a bare `generate-data` does"""
+    check_output_dependencies(args)
+    json_dir = args.transform_json_dir if "json" in args.formats else None
+    if args.pipeline:
+        tables = pipeline_tables(args, json_dir)
+    else:
+        run_download(args)
+        tables = process_tables(args, json_dir)
+    export_tables(args, tables)
+
+
+def run_query(args):
+    """Write the measurements matching the filters to standard output"""
+    import csv
+    import json
+    from iaea.orbs.process.sqlite_store import QUERY_COLUMNS
+    from iaea.orbs.process.sqlite_store import MeasurementQuery
+    from iaea.orbs.process.sqlite_store import query_measurements
+
+    query = MeasurementQuery(
+        sample_type=args.sample_type, station_id=args.station_id, station=args.station,
+        org=args.org, nuclide=args.nuclide, depth=args.depth,
+        since=args.since, before=args.before, limit=args.limit
+    )
+    try:
+        rows = query_measurements(args.sqlite_db, query)
+    except FileNotFoundError as e:
+        sys.exit(str(e))
+    if args.output_format == "csv":
+        writer = csv.writer(sys.stdout, lineterminator="\n")
+        writer.writerow(QUERY_COLUMNS)
+        writer.writerows(rows)
+    else:
+        for row in rows:
+            sys.stdout.write(json.dumps(dict(zip(QUERY_COLUMNS, row))) + "\n")
+
+
+def run_serve(args):
+    """
+    Serve measurement queries from memory until interrupted, rebuilding the
+    snapshot from the parse cache on a schedule
+    """
+    from iaea.orbs.process.generate_csv import long_measurements
+    from iaea.orbs.process.serve import MeasurementServer
+    from iaea.orbs.process.serve import MeasurementSnapshot
+
+    def load_snapshot():
+        if args.refresh_download:
+            run_download(args)
+        tables = process_tables(args, None)
+        return MeasurementSnapshot({
+            sample_type: long_measurements(table) for sample_type, table in tables.items()
+        })
+
+    server = MeasurementServer(load_snapshot(), args.host, args.port,
+                               load_snapshot, args.refresh_interval)
+    logger.info("Serving %d measurements at %s/measurements", len(server.snapshot), server.url)
+    serve_until_interrupted(server)
+
+
+def main():
+    """
+    Main function that runs the selected command, recording the run metrics,
+    and checkpointing it in a journal that is removed once the run completes
+    """
+    args = parse_arguments()
+    if args.command == "query":
+        args.handler(args)
+        return
+
+    from iaea.orbs.process.journal import RunJournal
+
+    run_name = f"{args.command}_" + datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    if args.profile:
+        metrics.profile_dir = join(args.metrics_dir, f"{run_name}_profiles")
+    # Options deciding what the run produces, a resumed run must have the same
+    options = {
+        name: value for name, value in vars(args).items() if name not in RUN_SETTINGS
+    }
+    # A server runs until stopped, there is nothing to resume
+    args.run_journal = None if args.command == "serve" else RunJournal(
+        args.journal or RunJournal.default_path(args.download_dir),
+        args.command, options, args.resume
+    )
+    try:
+        args.handler(args)
+        if args.run_journal is not None:
+            args.run_journal.finish()
+    finally:
+        # Keeps the latest checkpoints of an interrupted run, a finished one is not saved
+        if args.run_journal is not None:
+            args.run_journal.save()
+        metrics_file = join(args.metrics_dir, f"{run_name}.json")
+        metrics.save(metrics_file)
+        logger.info("Run metrics saved to '%s'", metrics_file)
 
 
 if __name__ == "__main__":
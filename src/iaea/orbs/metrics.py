@@ -0,0 +1,129 @@
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from iaea.orbs.utils import logger
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mib() -> Dict[str, Optional[float]]:
+    """Peak resident set size of this process and of its finished child processes"""
+    if resource is None:
+        return {"self": None, "children": None}
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        who: resource.getrusage(flag).ru_maxrss * unit / 2 ** 20
+        for who, flag in (("self", resource.RUSAGE_SELF), ("children", resource.RUSAGE_CHILDREN))
+    }
+
+
+class RunMetrics:
+    """
+    Stage timings and counters of one generate-data run
+
+    Counters are thread-safe. Counters incremented in worker processes are sent
+    back with each result, see collect_counters, and merged into the main process
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Counter = Counter()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.started = datetime.now(timezone.utc)
+        # Directory receiving one cProfile file per stage, None disables profiling
+        self.profile_dir: Optional[str] = None
+        self._profiling = False
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """Increment a counter, e.g. 'http.status.200' or 'parse.failures.Fish.Dt'"""
+        with self._lock:
+            self.counters[name] += amount
+
+    def merge(self, counters: Counter) -> None:
+        """Add counters collected elsewhere, e.g. in a worker process"""
+        if counters:
+            with self._lock:
+                self.counters.update(counters)
+
+    def pop_counters(self) -> Counter:
+        """Return the counters and reset them"""
+        with self._lock:
+            counters, self.counters = self.counters, Counter()
+        return counters
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time a stage of the run, recording the peak RSS at its end, and
+        profile it when profiling is enabled and no enclosing stage is profiled
+        """
+        profiler = None
+        if self.profile_dir and not self._profiling:
+            profiler = cProfile.Profile()
+            self._profiling = True
+            profiler.enable()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler:
+                profiler.disable()
+                self._profiling = False
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{name}.prof"))
+
+            self.stages[name] = {"wall_s": round(elapsed, 4), "peak_rss_mib": peak_rss_mib()}
+            logger.info("Stage '%s' finished in %.2f s", name, elapsed)
+
+    def to_dict(self) -> dict:
+        """Metrics of the run, counters being nested by their dotted names"""
+        counters: Dict[str, Any] = {}
+        for name, value in sorted(self.counters.items()):
+            *parents, leaf = name.split(".")
+            node = counters
+            for parent in parents:
+                node = node.setdefault(parent, {})
+            node[leaf] = value
+
+        return {
+            "started": self.started.isoformat(),
+            "finished": datetime.now(timezone.utc).isoformat(),
+            "stages": self.stages,
+            "counters": counters,
+            "peak_rss_mib": peak_rss_mib(),
+        }
+
+    def save(self, path: str) -> None:
+        """Write the metrics of the run to a JSON file"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as outfile:
+            json.dump(self.to_dict(), outfile, indent=4)
+
+
+# Metrics of the current run, shared like the logger
+metrics = RunMetrics()
+
+
+def collect_counters(func: Callable, *args) -> Tuple[Any, Counter]:
+    """
+    Run a task in a worker process and return its result together with the
+    counters it incremented, for the main process to merge
+    """
+    metrics.pop_counters()
+    result = func(*args)
+    return result, metrics.pop_counters()
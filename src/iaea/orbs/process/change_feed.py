@@ -0,0 +1,113 @@
+import json
+import os
+import pickle
+from datetime import datetime, timezone
+from os.path import join
+from typing import Dict, Optional
+
+import pandas as pd
+
+from iaea.orbs import logger
+from iaea.orbs.metrics import metrics
+from iaea.orbs.process.generate_csv import LONG_COLUMNS
+from iaea.orbs.process.json_writer import measurement_records
+from iaea.orbs.utils import atomic_write
+
+
+# Stable key of a measurement. The unit tells apart the H-3 results of one
+# sample given per kg and per litre, and 'seq' numbers the rows the source
+# files repeat with the same key, in file order
+FEED_KEY = ["sample_type", "id", "depth", "begperiod", "Sample", "Radionuclide", "Unit", "seq"]
+FEED_STATE = "feed_state.pickle"
+# Bump when the key or the record hashes change, the next delta then re-inserts everything
+FEED_VERSION = 1
+JSON_OPTIONS = {"ensure_ascii": False, "separators": (",", ":")}
+
+
+def keyed_measurements(long_tables: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """
+    Long measurements of every sample type (see generate_csv.long_measurements)
+    with their FEED_KEY, and 64-bit hashes of the key and of the whole record
+    """
+    frames = [
+        long.astype({column: object for column in long.select_dtypes("category").columns})
+        .assign(sample_type=sample_type)
+        for sample_type, long in long_tables.items() if not long.empty
+    ]
+    if not frames:
+        return pd.DataFrame(columns=FEED_KEY + ["key_hash", "row_hash"])
+    df = pd.concat(frames, ignore_index=True)
+    df["seq"] = df.groupby(FEED_KEY[:-1], dropna=False, sort=False).cumcount()
+    df["key_hash"] = pd.util.hash_pandas_object(df[FEED_KEY], index=False)
+    df["row_hash"] = pd.util.hash_pandas_object(df[["sample_type", *LONG_COLUMNS]], index=False)
+    return df
+
+
+def load_feed_state(feed_dir: str) -> Optional[pd.DataFrame]:
+    """Keys and record hashes of the previous run, None before the first one"""
+    path = join(feed_dir, FEED_STATE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as state_file:
+        state = pickle.load(state_file)
+    if state.get("version") != FEED_VERSION:
+        logger.warning("Change feed state of another version, every measurement is re-inserted")
+        return None
+    return state["measurements"]
+
+
+def _lines(op: str, rows: pd.DataFrame, with_record: bool):
+    keys = measurement_records(rows[FEED_KEY])
+    if not with_record:
+        return (json.dumps({"op": op, "key": key}, **JSON_OPTIONS) for key in keys)
+    records = measurement_records(rows[["sample_type", *LONG_COLUMNS]])
+    return (json.dumps({"op": op, "key": key, "record": record}, **JSON_OPTIONS)
+            for key, record in zip(keys, records))
+
+
+def write_change_feed(long_tables: Dict[str, pd.DataFrame], feed_dir: str,
+                      run_id: Optional[str] = None) -> Dict[str, int]:
+    """
+    Compare the measurements with those of the previous run and append one
+    NDJSON delta file to feed_dir, named after the run so that the files sort
+    in run order. Each line is an "insert", "update" (with the key and the
+    full record) or "delete" (with the key only) operation; the first run
+    inserts every measurement
+
+    Returns the number of operations of each kind, no file being written
+    when nothing changed
+    """
+    current = keyed_measurements(long_tables)
+    previous = load_feed_state(feed_dir)
+    if previous is None:
+        previous = pd.DataFrame(columns=FEED_KEY + ["key_hash", "row_hash"])
+
+    known = current["key_hash"].isin(previous["key_hash"])
+    previous_hashes = previous.set_index("key_hash")["row_hash"]
+    changed = known & (current["key_hash"].map(previous_hashes) != current["row_hash"])
+    inserted, updated = current[~known], current[changed]
+    deleted = previous[~previous["key_hash"].isin(current["key_hash"])]
+    counts = {"inserted": len(inserted), "updated": len(updated), "deleted": len(deleted)}
+
+    os.makedirs(feed_dir, exist_ok=True)
+    if any(counts.values()):
+        run_id = run_id or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        delta_path = join(feed_dir, f"{run_id}.ndjson")
+        with atomic_write(delta_path, "w", encoding="utf-8") as delta:
+            for op, rows, with_record in (("insert", inserted, True), ("update", updated, True),
+                                          ("delete", deleted, False)):
+                delta.writelines(line + "\n" for line in _lines(op, rows, with_record))
+        logger.info("Change feed: %d inserted, %d updated, %d deleted in '%s'",
+                    counts["inserted"], counts["updated"], counts["deleted"], delta_path)
+    else:
+        logger.info("Change feed: no measurement changed")
+
+    # Saved after the delta: an interrupted run repeats its delta rather than losing it
+    with atomic_write(join(feed_dir, FEED_STATE), "wb") as state_file:
+        pickle.dump({"version": FEED_VERSION,
+                     "measurements": current[FEED_KEY + ["key_hash", "row_hash"]]},
+                    state_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    for kind, count in counts.items():
+        metrics.count(f"changes.{kind}", count)
+    return counts
@@ -1,60 +1,188 @@
+import hashlib
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
-import random
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
 import requests
-from typing import List
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from iaea.orbs import logger
+from iaea.orbs.metrics import metrics
+from iaea.orbs.process.journal import RunJournal
+from iaea.orbs.process.manifest import DownloadManifest
+from iaea.orbs.process.manifest import file_sha256
+
+
+# Sample type in the station registry -> (download category, file prefix)
+DATASETS: Dict[str, Tuple[str, str]] = {
+    "Seawater": ("Seawater", "Seawater_10_"),
+    "Fish": ("Fishes", "Fishes_20_"),
+    "Seaweed": ("Seaweeds", "Seaweeds_30_"),
+}
 
 
 @dataclass
 class DownloadConfig:
-    category: str      # e.g., "Seawater" or "Fishes" or "Seaweeds"
-    prefix: str        # e.g., "Seawater_10_" or "Fishes_20_" or "Seaweeds_30_"
-    start_num: int     # Starting file number
-    end_num: int       # Ending file number (inclusive)
-    min_delay: float   # Minimum delay between downloads
-    max_delay: float   # Maximum delay between downloads
-    skipped_files: List[int] = field(default_factory=list) 
+    category: str         # e.g., "Seawater" or "Fishes" or "Seaweeds"
+    prefix: str           # e.g., "Seawater_10_" or "Fishes_20_" or "Seaweeds_30_"
+    file_nums: List[int]  # File numbers to download
+    max_workers: int = 4              # Number of concurrent download threads
+    requests_per_second: float = 2.0  # Request budget shared by all workers (0 disables it)
+    skipped_files: List[int] = field(default_factory=list)
+
+# Size of the chunks a download is streamed to disk in
+CHUNK_SIZE = 64 * 1024
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter spacing requests evenly to a requests-per-second budget
+    """
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def wait(self) -> None:
+        """Block until the caller may issue its next request"""
+        if not self.interval:
+            return
+        with self._lock:
+            slot = max(self._next_slot, time.monotonic())
+            self._next_slot = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def create_session(pool_size: int) -> requests.Session:
+    """
+    Create a keep-alive session whose connection pool fits all download workers
+    """
+    retries = Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retries)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
 
+def manifest_key(config: DownloadConfig, file_num: int) -> str:
+    """Key of a dataset file in the download manifest"""
+    return f"{config.category}/{config.prefix}{file_num}.csv"
 
-def download_csv(base_url: str, config: DownloadConfig, file_num: int, output_dir: str) -> bool:
+
+def stream_to_file(response: requests.Response, path: Path) -> Tuple[int, str]:
+    """
+    Stream a response body to a file, returning its size and SHA-256 digest
+    """
+    size = 0
+    digest = hashlib.sha256()
+    with open(path, "wb") as outfile:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            outfile.write(chunk)
+            size += len(chunk)
+            digest.update(chunk)
+    return size, digest.hexdigest()
+
+
+def replace_if_changed(part_path: Path, output_path: Path, size: int, sha256: str) -> None:
+    """Move a downloaded file over its output, unless the output has the same content"""
+    unchanged = output_path.exists() and output_path.stat().st_size == size and \
+        file_sha256(output_path.read_bytes()) == sha256
+    if not unchanged:
+        os.replace(part_path, output_path)
+        metrics.count("download.files_changed")
+
+
+def download_csv(base_url: str, config: DownloadConfig, file_num: int, output_dir: str, *,
+                 session: Optional[requests.Session] = None,
+                 manifest: Optional[DownloadManifest] = None) -> bool:
     """
     Download a single CSV file
+
+    The body is streamed to a temporary file beside the output, which replaces
+    it only once complete and changed, so an interrupted download never leaves
+    a truncated file. With a manifest, unchanged files are detected with a
+    conditional request and left untouched on disk; known gaps are skipped by
+    download_dataset before any request
     """
-    url = f"{base_url}/{config.category}/{config.prefix}{file_num}.csv"
     output_path = Path(output_dir) / f"{config.prefix}{file_num}.csv"
+    part_path = output_path.with_name(f"{output_path.name}.part")
+    key = manifest_key(config, file_num)
 
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
+        headers = manifest.conditional_headers(key, output_path) if manifest else {}
+        with (session or requests).get(f"{base_url}/{config.category}/{output_path.name}",
+                                       headers=headers, timeout=10, stream=True) as response:
+            metrics.count(f"download.http_status.{response.status_code}")
+            if response.status_code == 304:
+                if manifest:
+                    manifest.record_not_modified(key)
+                metrics.count("download.not_modified")
+                return True
+            response.raise_for_status()
 
-        if 'text/csv' not in response.headers.get('content-type', '').lower():
-            logger.warning("File %d doesn't appear to be a CSV. Skipping...", file_num)
-            config.skipped_files.append(file_num)
-            return False
+            if 'text/csv' not in response.headers.get('content-type', '').lower():
+                logger.warning("File %d doesn't appear to be a CSV. Skipping...", file_num)
+                config.skipped_files.append(file_num)
+                return False
+
+            size, sha256 = stream_to_file(response, part_path)
+        metrics.count("download.bytes", size)
 
-        output_path.write_bytes(response.content)
+        if manifest:
+            manifest.record_file(key, response.headers, size, sha256)
+        metrics.count("download.files")
+        replace_if_changed(part_path, output_path, size, sha256)
         return True
 
     except requests.exceptions.HTTPError as err:
         if response.status_code == 404:
+            if manifest:
+                manifest.record_missing(key)
             config.skipped_files.append(file_num)
             return False
         logger.error("HTTP error occurred while downloading file %d: '%s'", file_num, err)
+        metrics.count("download.errors")
         config.skipped_files.append(file_num)
         return False
     except Exception as exc:
         logger.error("Error downloading file %d: %s", file_num, exc)
+        metrics.count("download.errors")
         config.skipped_files.append(file_num)
         return False
+    finally:
+        if part_path.exists():
+            part_path.unlink()
 
 
-def download_dataset(base_url: str, config: DownloadConfig, output_dir: str) -> List[int]:
+def download_dataset(base_url: str, config: DownloadConfig, output_dir: str,
+                     rate_limiter: Optional[RateLimiter] = None,
+                     manifest: Optional[DownloadManifest] = None,
+                     journal: Optional[RunJournal] = None,
+                     on_file: Optional[Callable[[Path], None]] = None) -> List[int]:
     """
-    Download a complete dataset with the given configuration
-    
+    Download a complete dataset with the given configuration, fetching files
+    concurrently over a pooled session within the configured request budget
+
+    With a journal, each downloaded file is checkpointed, and files downloaded
+    by the interrupted run being resumed are not requested again. on_file is
+    called from the download workers with the path of each file number once
+    it is settled: written, unchanged, skipped or failed
+
     Returns:
     List of skipped file numbers
     """
@@ -64,17 +192,96 @@ def download_dataset(base_url: str, config: DownloadConfig, output_dir: str) ->
     # Reset skipped files list before starting
     config.skipped_files.clear()
 
-    file_num = config.start_num
-    while file_num <= config.end_num:
-        # Random delay between configured values
-        delay = random.uniform(config.min_delay, config.max_delay)
-        time.sleep(delay)
+    workers = max(1, config.max_workers)
+    limiter = rate_limiter or RateLimiter(config.requests_per_second)
 
-        download_csv(base_url, config, file_num, str(category_dir))
-        file_num += 1
+    def fetch(file_num: int) -> bool:
+        try:
+            return fetch_file(file_num)
+        finally:
+            if on_file:
+                on_file(category_dir / f"{config.prefix}{file_num}.csv")
 
+    def fetch_file(file_num: int) -> bool:
+        key = manifest_key(config, file_num)
+        # Known gaps do not consume the request budget
+        if manifest and manifest.is_known_missing(key):
+            metrics.count("download.known_missing")
+            config.skipped_files.append(file_num)
+            return False
+        if journal and journal.file_done(key):
+            metrics.count("download.resumed")
+            return True
+        limiter.wait()
+        downloaded = download_csv(base_url, config, file_num, str(category_dir),
+                                  session=session, manifest=manifest)
+        if journal and downloaded:
+            journal.complete_file(key)
+        return downloaded
+
+    try:
+        with create_session(workers) as session, \
+                ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(fetch, config.file_nums))
+    finally:
+        # Also kept when interrupted, for the resumed run to revalidate what was fetched
+        if manifest:
+            manifest.save()
+        # Files completed since the last periodic save would be downloaded again otherwise
+        if journal:
+            journal.save()
+
+    config.skipped_files.sort()
     if config.skipped_files:
         logger.warning("Skipped not found files for '%s': %s",
                        config.category, config.skipped_files)
 
     return config.skipped_files
+
+
+def local_file_numbers(directory: Path, prefix: str) -> Set[int]:
+    """File numbers of the dataset files already present in a directory"""
+    if not directory.is_dir():
+        return set()
+    return {
+        int(path.stem[len(prefix):]) for path in directory.glob(f"{prefix}*.csv")
+        if path.stem[len(prefix):].isdigit()
+    }
+
+
+def discover_file_numbers(station_ids: Iterable[int], cached: Iterable[int],
+                          probe_beyond: int = 0) -> List[int]:
+    """
+    Build a download work list from the registered station IDs and the previously
+    discovered file numbers, plus a bounded probe beyond the highest known number
+
+    The bound is per run, not absolute: a probed file that is found counts as
+    discovered in the next runs, which then probe beyond it. Files that are not
+    found do not move the probe forward
+    """
+    known = set(station_ids).union(cached)
+    if known and probe_beyond > 0:
+        highest = max(known)
+        known.update(range(highest + 1, highest + 1 + probe_beyond))
+    return sorted(known)
+
+
+def build_download_configs(stations_info: dict, output_dir: str,
+                           manifest: Optional[DownloadManifest] = None,
+                           probe_beyond: int = 0, **options) -> List[DownloadConfig]:
+    """
+    Build one download configuration per sample type of the station registry
+
+    File numbers already downloaded or recorded in the manifest count as discovered,
+    so stations found by an earlier probe are kept without being registered, and
+    the probe starts past them (see discover_file_numbers)
+    """
+    configs = []
+    for sample_type, (category, prefix) in DATASETS.items():
+        station_ids = [int(station["id"]) for station in stations_info.get(sample_type, [])]
+        cached = local_file_numbers(Path(output_dir) / category, prefix)
+        if manifest:
+            cached.update(manifest.file_numbers(category, prefix))
+        file_nums = discover_file_numbers(station_ids, cached, probe_beyond)
+        configs.append(DownloadConfig(category, prefix, file_nums, **options))
+    return configs
@@ -1,67 +1,133 @@
 import pandas as pd
 
+from iaea.orbs.process.json_writer import DOUBLE_PRECISION
+from iaea.orbs.utils import atomic_write
+
+
+FISH_SEAWEED_COLUMNS = [
+    "id", "org", "station", "lat", "lon", "begperiod", "begperiod_raw", "Sample",
+    "Radionuclide", "Dt", "Dt_unc", "ND", "ND_unc", "Unit"
+]
+SEAWATER_COLUMNS = [
+    "id", "org", "station", "lat", "lon", "depth", "begperiod", "begperiod_raw",
+    "Cs-134", "Cs-134_unc", "Cs-134_nd", "Cs-134_nd_unc",
+    "Cs-137", "Cs-137_unc", "Cs-137_nd", "Cs-137_nd_unc",
+    "H-3", "H-3_unc", "H-3_nd", "H-3_nd_unc"
+]
+# One row per measurement and nuclide: the detected value (Dt) and the
+# detection limit (ND), each with its uncertainty
+LONG_COLUMNS = [
+    "id", "org", "station", "lat", "lon", "depth", "begperiod", "begperiod_raw",
+    "Sample", "Radionuclide", "Unit", "value", "value_unc", "nd", "nd_unc"
+]
+# Repeated labels of the measurement frames, held as categories
+LABEL_COLUMNS = ["org", "station", "depth", "Sample", "Radionuclide", "Unit"]
+# Value of the measurement columns a station file does not have
+MISSING = float("nan")
+STATION_FIELDS = ["id", "org", "station", "lat", "lon", "depth", "begperiod", "begperiod_raw"]
+
+
+def compact_measurements(measurements: pd.DataFrame) -> pd.DataFrame:
+    """
+    Hold the repeated labels of a measurement frame as categories, the values
+    and uncertainties being float columns already
+    """
+    for column in measurements.columns.intersection(LABEL_COLUMNS):
+        measurements[column] = measurements[column].astype("category")
+    return measurements
+
+
+def flatten_station(station):
+    """
+    Flatten one processed station into a frame with one row per measurement,
+    the station fields being broadcast as columns. The measurements of the
+    station may be frames or, when loaded from JSON, records
+    """
+    header = {key: value for key, value in station.items() if key not in ("data", "depth_data")}
+    if "depth_data" in station:
+        frames = [
+            pd.DataFrame(depth_info["data"]).assign(depth=depth_info["depth"])
+            for depth_info in station["depth_data"]
+        ]
+    else:
+        data = station.get("data")
+        frames = [pd.DataFrame(data if data is not None else [])]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    flat = pd.concat(frames, ignore_index=True).assign(**header)
+
+    # Empty columns hold NaN rather than None, so that stations concatenate to stable dtypes
+    empty = flat.columns[flat.isna().all()]
+    flat[empty] = flat[empty].astype(float)
+    # Same precision as the numbers written to the JSON output
+    return compact_measurements(flat.round(DOUBLE_PRECISION))
+
+
+def flatten_stations(stations) -> pd.DataFrame:
+    """Flatten processed stations into a single frame of measurements"""
+    frames = [frame for frame in map(flatten_station, stations) if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    return compact_measurements(pd.concat(frames, ignore_index=True))
+
+
+def save_flat_measurements(measurements, columns, output_path, compresslevel=None):
+    """
+    Write flat measurements (records or a frame, one row per measurement with its
+    station fields) to CSV, keeping the given columns that hold any data.
+    The file is compressed when output_path has a .gz or .zst extension
+    """
+    df = pd.DataFrame(measurements).reindex(columns=columns)
+    df = df.dropna(axis=1, how='all')
+    with atomic_write(output_path, "w", compresslevel, encoding="utf-8", newline="") as outfile:
+        df.to_csv(outfile, index=False)
+
 
 def extract_fish_and_seaweed_measurements(station_coord, output_path):
     """
     Transform fish or seaweed radiation measurement data into a flat CSV format
     """
-    flattened_data = []
-    for station in station_coord:
-        for measurement in station["data"]:
-            record = {
-                "id": station.get("id"),
-                "org": station.get("org"),
-                "station": station.get("station"),
-                "lat": station.get("lat", None),
-                "lon": station.get("lon", None),
-                "begperiod": measurement.get("begperiod"),
-                "Sample": measurement.get("Sample", None),
-                "Radionuclide": measurement.get("Radionuclide", None),
-                "Dt": measurement.get("Dt", None),
-                "Dt_unc": measurement.get("Dt_unc", None),
-                "ND": measurement.get("ND", None),
-                "ND_unc": measurement.get("ND_unc", None),
-                "Unit": measurement.get("Unit", None)
-            }
-            flattened_data.append(record)
-
-    df = pd.DataFrame(flattened_data)
-    df = df.dropna(axis=1, how='all')
-    df.to_csv(output_path, index=False)
+    save_flat_measurements(flatten_stations(station_coord), FISH_SEAWEED_COLUMNS, output_path)
 
 
 def extract_seawater_measurements(station_coord, output_path):
     """
     Transform seawater radiation measurement data into a flat CSV format
     """
-    flattened_data = []
-    for station in station_coord:
-        for depth_info in station["depth_data"]:
-            for measurement in depth_info["data"]:
-
-                record = {
-                    "id": station.get("id"),
-                    "org": station.get("org"),
-                    "station": station.get("station"),
-                    "lat": station.get("lat", None),
-                    "lon": station.get("lon", None),
-                    "depth": depth_info.get("depth", None),
-                    "begperiod": measurement.get("begperiod"),
-                    "Cs-134": measurement.get("Cs-134", None),
-                    "Cs-134_unc": measurement.get("Cs-134_unc", None),
-                    "Cs-134_nd": measurement.get("Cs-134_nd", None),
-                    "Cs-134_nd_unc": measurement.get("Cs-134_nd_unc", None),
-                    "Cs-137": measurement.get("Cs-137", None),
-                    "Cs-137_unc": measurement.get("Cs-137_unc", None),
-                    "Cs-137_nd": measurement.get("Cs-137_nd", None),
-                    "Cs-137_nd_unc": measurement.get("Cs-137_nd_unc", None),
-                    "H-3": measurement.get("H-3", None),
-                    "H-3_unc": measurement.get("H-3_unc", None),                    
-                    "H-3_nd": measurement.get("H-3_nd", None),
-                    "H-3_nd_unc": measurement.get("H-3_nd_unc", None)
-                }
-                flattened_data.append(record)
-
-    df = pd.DataFrame(flattened_data)
-    df = df.dropna(axis=1, how='all')
-    df.to_csv(output_path, index=False)
+    save_flat_measurements(flatten_stations(station_coord), SEAWATER_COLUMNS, output_path)
+
+
+def long_measurements(measurements: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reshape flat measurements to one row per nuclide, see LONG_COLUMNS
+
+    Fish and Seaweed rows already name their nuclide, Seawater rows carry one
+    group of columns per nuclide, which are melted, dropping the empty ones
+    """
+    if measurements.empty:
+        return pd.DataFrame(columns=LONG_COLUMNS)
+
+    if "Radionuclide" in measurements.columns:
+        long = measurements.rename(
+            columns={"Dt": "value", "Dt_unc": "value_unc", "ND": "nd", "ND_unc": "nd_unc"})
+    else:
+        nuclides = [
+            column for column in measurements.columns
+            if column not in STATION_FIELDS and not column.endswith(("_unc", "_nd"))
+        ]
+        fields = measurements[[c for c in STATION_FIELDS if c in measurements.columns]]
+        frames = [
+            fields.assign(
+                Radionuclide=nuclide,
+                value=measurements[nuclide],
+                value_unc=measurements.get(f"{nuclide}_unc", MISSING),
+                nd=measurements.get(f"{nuclide}_nd", MISSING),
+                nd_unc=measurements.get(f"{nuclide}_nd_unc", MISSING),
+            )
+            for nuclide in nuclides
+        ]
+        long = pd.concat(frames, ignore_index=True)
+        long = long[long[["value", "nd"]].notna().any(axis=1)]
+
+    return compact_measurements(long.reindex(columns=LONG_COLUMNS).reset_index(drop=True))
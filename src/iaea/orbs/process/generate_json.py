@@ -1,22 +1,53 @@
+import csv
+import os
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from contextlib import ExitStack, nullcontext
+from dataclasses import dataclass
+from functools import partial
+from io import StringIO
 from os.path import join, splitext, basename
-from os import listdir
-from typing import Optional, Dict, List, Any
+from os import listdir, scandir
+from typing import Optional, Dict, Iterable, List, Any, Set, Tuple
 import numpy as np
 import pandas as pd
-from pkg_resources import resource_filename
+from pandas.api.types import is_bool_dtype
 
 from iaea.orbs import logger
+from iaea.orbs.metrics import collect_counters
+from iaea.orbs.metrics import metrics
+from iaea.orbs.process.generate_csv import compact_measurements
+from iaea.orbs.process.generate_csv import flatten_station
+from iaea.orbs.process.json_writer import StationJsonWriter
+from iaea.orbs.process.json_writer import layout_extension
+from iaea.orbs.process.parse_cache import ParseCache
+from iaea.orbs.process.parse_cache import files_fingerprint
+from iaea.orbs.process.station_index import load_station_index
+from iaea.orbs.utils import compressed_path
 from iaea.orbs.utils import generate_output_path
 from iaea.orbs.utils import load_json_data
+from iaea.orbs.utils import package_file
 from iaea.orbs.utils import parse_dms_coordinates
 
 
-STATIONS_POINTS = resource_filename(
-    "iaea.orbs", "stations/station_points.csv"
-)
-ALPES_SEAWATER_DATA = resource_filename(
-    "iaea.orbs",  "stations/alps_seawater_data.csv"
+STATIONS_POINTS = package_file("stations/station_points.csv")
+ALPES_SEAWATER_DATA = package_file("stations/alps_seawater_data.csv")
+
+# Sample type in the station registry -> its directory in the download directory
+SAMPLE_TYPE_DIRS = {"Seawater": "Seawater", "Fish": "Fishes", "Seaweed": "Seaweeds"}
+
+# Bump whenever process_sample_data produces different results for the same file,
+# so that parse cache entries written by the previous version are discarded
+PARSER_VERSION = "3"
+
+# Sampling date formats found in the ORBS files and the reference data
+SAMPLING_DATE_FORMATS = (
+    "%Y/%m/%d %H:%M",
+    "%Y/%m/%d",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d",
 )
+ISO_TIMESTAMP = "%Y-%m-%dT%H:%M:%S"
 
 
 def parse_column_value(value):
@@ -44,11 +75,122 @@ def parse_column_value(value):
         return None, None
 
 
+def _parse_text(value: str) -> Tuple[float, Optional[float]]:
+    """Parse a stripped cell, raising ValueError when it is not a number"""
+    if '±' in value:
+        parts = value.split('±')
+        return float(parts[0].strip()), float(parts[1].strip())
+    return float(value.replace('%', '')), None
+
+
+def parse_column_values(column: pd.Series) -> Tuple[pd.Series, pd.Series, int]:
+    """
+    Vectorized parse_column_value over a whole column
+
+    Columns of plain numbers are converted in one pass. Otherwise pd.to_numeric
+    converts the plain cells and only the ones it rejects (uncertainties,
+    percentages, placeholders) are parsed one by one.
+    Returns the float values, the uncertainties and the number of cells that
+    could not be converted.
+    """
+    if is_bool_dtype(column):
+        # Boolean cells are parsed from their 'True' / 'False' text, which is not a number
+        column = column.astype(str)
+
+    uncertainties = np.full(len(column), np.nan)
+    try:
+        values = column.to_numpy(dtype=float, na_value=np.nan)
+        invalid = 0
+    except (ValueError, TypeError):
+        values = pd.to_numeric(column, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        missing = (column.isna() | (column == '')).to_numpy()
+        residual = np.flatnonzero(np.isnan(values) & ~missing)
+
+        invalid = 0
+        for position, value in zip(residual, column.iloc[residual]):
+            try:
+                value, uncertainty = _parse_text(str(value).strip())
+            except (ValueError, TypeError):
+                invalid += 1
+                continue
+            values[position] = value
+            if uncertainty is not None:
+                uncertainties[position] = uncertainty
+
+    return (
+        pd.Series(values, index=column.index),
+        pd.Series(uncertainties, index=column.index),
+        invalid
+    )
+
+
+def parse_sampling_dates(column: pd.Series, formats: Tuple[str, ...] = SAMPLING_DATE_FORMATS
+                         ) -> Tuple[pd.Series, int, Tuple[str, ...]]:
+    """
+    Vectorized parse of a column of sampling dates in mixed formats
+
+    Each format converts the cells left over by the previous ones in a single
+    pass. Returns the datetime64 values, the number of non-empty cells that
+    could not be parsed, and the formats reordered with the one that matched
+    last first, to be passed for the next column as files rarely mix formats.
+    """
+    text = column.astype("string").str.strip()
+    dates = pd.Series(pd.NaT, index=column.index, dtype="datetime64[ns]")
+    pending = (text.notna() & (text != "")).to_numpy(dtype=bool)
+
+    preferred = list(formats)
+    for date_format in formats:
+        if not pending.any():
+            break
+        parsed = pd.to_datetime(text[pending], format=date_format, errors="coerce")
+        matched = parsed.notna()
+        if matched.any():
+            dates.loc[parsed.index[matched]] = parsed[matched]
+            pending[column.index.get_indexer(parsed.index[matched])] = False
+            preferred.remove(date_format)
+            preferred.insert(0, date_format)
+
+    return dates, int(pending.sum()), tuple(preferred)
+
+
+@dataclass(frozen=True)
+class CsvFileEntry:
+    name: str      # File name within the sample type directory
+    path: str      # Full path of the file
+    mtime: float   # Modification time, in seconds since the epoch
+    size: int      # Size in bytes
+
+
 class DataProcessor:
-    def __init__(self, station_coord_file: str, input_dir : str, output_dir: str):
+    def __init__(self, station_coord_file: str, input_dir : str, output_dir: Optional[str], *,
+                 station_match_tolerance: float = 0.0005, workers: int = 1,
+                 json_layout: str = "json", parse_cache_dir: Optional[str] = None,
+                 compact_json: bool = False, compression: str = "none",
+                 compresslevel: Optional[int] = None):
         self.station_coord = load_json_data(station_coord_file)
         self.input_dir = input_dir
+        # JSON output directory, None when only the returned tables are wanted
         self.output_dir = output_dir
+        # Output layout, one of json_writer.JSON_LAYOUTS
+        self.json_layout = json_layout
+        # Unindented "json" layout, and compression of the output files (see utils.COMPRESSIONS)
+        self.compact_json = compact_json
+        self.compression = compression
+        self.compresslevel = compresslevel
+        # Number of worker processes for station processing, 1 keeps it in-process
+        self.workers = workers
+        # Nearest-point fallback radius (degrees) for station-name lookup, 0 disables it
+        self.station_match_tolerance = station_match_tolerance
+        # Sampling date formats, the one that matched last first (see parse_sampling_dates)
+        self.date_formats = SAMPLING_DATE_FORMATS
+        # Parsed sample files of previous runs, None disables the cache
+        self.parse_cache = None
+        if parse_cache_dir is not None:
+            fingerprint = files_fingerprint(
+                PARSER_VERSION, [station_coord_file, STATIONS_POINTS, ALPES_SEAWATER_DATA])
+            self.parse_cache = ParseCache(parse_cache_dir, fingerprint)
+        self._station_names: Dict[tuple, Optional[str]] = {}
+        self._file_indexes: Dict[str, Dict[str, List[CsvFileEntry]]] = {}
 
 
     @staticmethod
@@ -80,6 +222,26 @@ class DataProcessor:
             if str(station_id) == DataProcessor.get_id(f)
         ]
 
+    @staticmethod
+    def build_file_index(directory: str) -> Dict[str, List[CsvFileEntry]]:
+        """Group the files of a directory by station ID in a single scan"""
+        index: Dict[str, List[CsvFileEntry]] = {}
+        with scandir(directory) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                index.setdefault(DataProcessor.get_id(entry.name), []).append(
+                    CsvFileEntry(entry.name, entry.path, stat.st_mtime, stat.st_size)
+                )
+        return index
+
+    def file_index(self, directory: str) -> Dict[str, List[CsvFileEntry]]:
+        """File index of a sample type directory, built on first use"""
+        if directory not in self._file_indexes:
+            self._file_indexes[directory] = DataProcessor.build_file_index(directory)
+        return self._file_indexes[directory]
+
     @staticmethod
     def find_matching_station(lon: float, lat: float, organization: str,
                               csv_file: str) -> Optional[str]:
@@ -87,34 +249,8 @@ class DataProcessor:
         if lon is None or lat is None:
             return None
 
-        def count_decimals(number):
-            """Count the number of decimal places in a float number"""
-            if '.' not in str(number):
-                return 0
-            return len(str(number).split('.')[1])
-
         try:
-            station_df = pd.read_csv(csv_file, index_col=False)
-            matches = station_df[
-                (station_df['org'] == organization) &
-                (station_df.apply(
-                    lambda row: round(float(row['lon']),
-                                count_decimals(row['lon'])) == round(float(lon),
-                                count_decimals(row['lon'])),
-                    axis=1
-                )) &
-                (station_df.apply(
-                    lambda row: round(float(row['lat']),
-                                count_decimals(row['lat'])) == round(float(lat),
-                                count_decimals(row['lat'])),
-                    axis=1
-                ))
-            ]
-
-            if not matches.empty:
-                return matches['station'].iloc[0]
-            return None
-
+            return load_station_index(csv_file).match(lon, lat, organization)
         except (pd.errors.EmptyDataError, pd.errors.ParserError) as e:
             logger.error("CSV parsing error in finding matching station for file %s: %s",
                          csv_file, e)
@@ -124,15 +260,29 @@ class DataProcessor:
             return None
 
     def _find_station_name(self, lon: float, lat: float, org: str) -> Optional[str]:
-        """Find the station name by comparing coordinates"""
-        station_points_matcher = DataProcessor.find_matching_station(
-                                lon, lat, org, STATIONS_POINTS)
-        alps_data_matcher = DataProcessor.find_matching_station(
-                            lon, lat, org,  ALPES_SEAWATER_DATA)
-        return (
-            station_points_matcher or
-            alps_data_matcher
-        )
+        """
+        Find the station name by comparing coordinates, falling back to the
+        nearest reference point within the configured tolerance
+        """
+        key = (lon, lat, org)
+        if key not in self._station_names:
+            self._station_names[key] = (
+                DataProcessor.find_matching_station(lon, lat, org, STATIONS_POINTS) or
+                DataProcessor.find_matching_station(lon, lat, org, ALPES_SEAWATER_DATA) or
+                self._find_nearest_station(lon, lat, org)
+            )
+        return self._station_names[key]
+
+    def _find_nearest_station(self, lon: float, lat: float, org: str) -> Optional[str]:
+        """Find the closest reference station within the station match tolerance"""
+        if self.station_match_tolerance <= 0:
+            return None
+        for reference_file in (STATIONS_POINTS, ALPES_SEAWATER_DATA):
+            index = load_station_index(reference_file, self.station_match_tolerance)
+            station = index.nearest(lon, lat, org)
+            if station:
+                return station
+        return None
 
     def _extract_depths(self, depth_line: str) -> List[str]:
         """Extract and clean depth values"""
@@ -157,11 +307,28 @@ class DataProcessor:
         """
         if column not in df.columns:
             return df
-        parsed_data = df[column].apply(parse_column_value)
-        df[column] = parsed_data.apply(lambda x: x[0]
-                                        if isinstance(x, tuple) else x)
-        df[f"{column}_unc"] = parsed_data.apply(lambda x: x[1]
-                                                 if isinstance(x, tuple) else None)
+        values, uncertainties, invalid = parse_column_values(df[column])
+        if invalid:
+            logger.error("Could not convert %d value(s) in column '%s'", invalid, column)
+            metrics.count(f"parse.failures.{column}", invalid)
+        df[column] = values
+        df[f"{column}_unc"] = uncertainties
+        return df
+
+    def update_sampling_dates(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Replace 'begperiod' with ISO timestamps, keeping the original text in
+        'begperiod_raw' next to it
+        """
+        if "begperiod" not in df.columns:
+            return df
+        raw = df["begperiod"]
+        dates, invalid, self.date_formats = parse_sampling_dates(raw, self.date_formats)
+        if invalid:
+            logger.error("Could not parse %d sampling date(s)", invalid)
+            metrics.count("parse.failures.begperiod", invalid)
+        df["begperiod"] = dates.dt.strftime(ISO_TIMESTAMP).where(dates.notna(), None)
+        df.insert(df.columns.get_loc("begperiod") + 1, "begperiod_raw", raw)
         return df
 
     def update_dateframe_for_columns(self, df : pd.DataFrame,
@@ -186,32 +353,60 @@ class DataProcessor:
         """
         Process the data from a CSV file for a given sample type (Seawater, Fish, or Seaweed),
         and update the station dictionary with the processed data
-        """
 
+        With a parse cache, files parsed by an earlier run are not parsed again
+        """
+        cache_key = None
+        if self.parse_cache is not None:
+            try:
+                with open(join(sample_type_dir, csv_file), 'rb') as f:
+                    cache_key = ParseCache.key(sample_type, f.read())
+            except IOError as e:
+                logger.error("IO error reading file %s: %s", csv_file, e)
+            cached = self.parse_cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                metrics.count(f"parse.cache_hits.{sample_type}")
+                station_dict.update(cached)
+                return station_dict
+
+        metrics.count(f"parse.files.{sample_type}")
         if sample_type == "Seawater":
             lines = self.get_lines(sample_type_dir, csv_file)
-            station_dict["depth_data"] = self.process_seawater_data(lines)
+            parsed = {"depth_data": self.process_seawater_data(lines)}
         else:
             try:
                 df = pd.read_csv(join(sample_type_dir, csv_file), skiprows=2)
                 df = self.update_fish_seaweed_dataframe(df)
                 df = df.rename(columns={"Date and time of Sampling": "begperiod"})
+                df = self.update_sampling_dates(df)
 
-                station_dict["data"] = df.replace({np.nan: None}).to_dict(orient="records")
+                parsed = {"data": compact_measurements(df)}
             except (pd.errors.EmptyDataError, pd.errors.ParserError):
+                metrics.count(f"parse.unreadable_files.{sample_type}")
                 return None
+
+        if cache_key:
+            self.parse_cache.put(cache_key, parsed)
+        station_dict.update(parsed)
         return station_dict
 
     def process_seawater_data(self, lines: List[str]) -> List[Dict[str, Any]]:
+        """
+        Parse the multi-row header (depth, nuclide and Dt/ND rows) once, read the
+        body once with the C CSV engine, and produce each depth from its columns
+
+        Returns one {"depth", "data"} entry per depth, its measurements as a frame
+        """
         try:
+            depth_line = lines[3].split(",")
             depths = self._extract_depths(lines[3])
             nuclides_line = lines[4].split(",")
-            depth_data = []
+            body = self._read_seawater_body(lines[6:])
 
             depth_data = [
                 {
                     "depth": self._process_depth(depth),
-                    "data": self._process_depth_data(lines, depths, nuclides_line, depth)
+                    "data": self._process_depth_data(body, depth_line, depths, nuclides_line, depth)
                 }
                 for depth in depths
             ]
@@ -221,6 +416,24 @@ class DataProcessor:
             logger.error("Error processing seawater data: %s", e)
             return []
 
+    @staticmethod
+    def _read_seawater_body(lines: List[str]) -> pd.DataFrame:
+        """
+        Read the measurement rows as strings, one column per comma-separated field
+        and rows padded to the widest one
+        """
+        width = max((line.count(",") for line in lines), default=0) + 1
+        body = pd.read_csv(
+            StringIO("\n".join(lines)),
+            header=None,
+            names=range(width),
+            dtype=str,
+            na_filter=False,
+            quoting=csv.QUOTE_NONE,
+            engine="c",
+        )
+        return body.replace({"-": None, "": None})
+
     def _process_depth(self, depth):
         if "surface" in depth.lower():
             return "Surface"
@@ -228,70 +441,272 @@ class DataProcessor:
             return "Bottom"
         return depth
 
-    def _process_depth_data(self, lines, depths, nuclides_line, current_depth):
+    def _process_depth_data(self, body, depth_line, depths, nuclides_line, current_depth):
 
-        start_index = list(lines[3].split(',')).index(current_depth)
-        end_index = list(lines[3].split(',')).index(depths[depths.index(current_depth) + 1]) \
+        start_index = depth_line.index(current_depth)
+        end_index = depth_line.index(depths[depths.index(current_depth) + 1]) \
             if depths.index(current_depth) < len(depths) - 1 else len(nuclides_line)
 
         columns_by_depth = self._get_depth_columns(nuclides_line, start_index, end_index)
 
-        data = pd.DataFrame([line.split(",") for line in lines[6:]])
-        data = data.iloc[:, start_index:end_index]
+        data = body.iloc[:, start_index:end_index]
         data.columns = columns_by_depth
-        data = data.replace({"-": None, "": None}).dropna(subset=['begperiod'])
-
-        df = self.update_seawater_dataframe(data)
-        df = df.dropna(axis=1, how='all')
+        data = data[data['begperiod'].notna()].copy()
 
-        return df.to_dict(orient="records")
+        df = self.update_sampling_dates(data)
+        df = self.update_seawater_dataframe(df)
+        return df.loc[:, df.notna().any()].reset_index(drop=True)
 
-    def process_station(self, sample_type: str, sample_type_dir: str) -> None:
-        """Process the data for a particular sample type (Seawater, Fish, or Seaweed)
+    def process_station_entry(self, sample_type: str, sample_type_dir: str, station: dict,
+                              csv_files: Optional[List[CsvFileEntry]] = None) -> Optional[dict]:
         """
-        output_file = generate_output_path(self.output_dir, sample_type, "json")
-        all_data = []
+        Process one station of the registry, returning None when it has no
+        coordinates or no data file. Its files are looked up in the file index
+        of the directory when not given
+        """
+        if not station["coordinates"]:
+            return None
 
-        for station in self.station_coord[sample_type]:
-            if not station["coordinates"]:
-                continue
+        parsed_lat, parsed_lon = parse_dms_coordinates(station["coordinates"])
+        if parsed_lat is None or parsed_lon is None:
+            return None
 
-            parsed_lat, parsed_lon = parse_dms_coordinates(station["coordinates"])
-            if parsed_lat is None or parsed_lon is None:
-                continue
+        org = station["org"]
+        station_name = station["station"] or \
+            self._find_station_name(float(parsed_lon), float(parsed_lat), org)
 
-            org = station["org"]
-            station_name = station["station"] or \
-                self._find_station_name(float(parsed_lon), float(parsed_lat), org)
+        station_dict = {
+            "id": int(station["id"]),
+            "org": org,
+            "station": station_name,
+            "lat": float(parsed_lat),
+            "lon": float(parsed_lon),
+        }
 
-            station_dict = {
-                "id": int(station["id"]),
-                "org": org,
-                "station": station_name,
-                "lat": float(parsed_lat),
-                "lon": float(parsed_lon),
-            }
+        if csv_files is None:
+            csv_files = self.file_index(sample_type_dir).get(str(station["id"]))
+        if not csv_files:
+            return None
 
-            csv_files = DataProcessor.get_csv_files(sample_type_dir, station["id"])
-            if not csv_files:
-                continue
+        for csv_file in csv_files:
+            self.process_sample_data(sample_type, sample_type_dir, csv_file.name, station_dict)
+
+        return station_dict
 
-            for csv_file in csv_files:
-                self.process_sample_data(sample_type, sample_type_dir, csv_file, station_dict)
+    def process_station(self, sample_type: str, sample_type_dir: str,
+                        executor: Optional[Executor] = None,
+                        collect: bool = True) -> Optional[pd.DataFrame]:
+        """Process the data for a particular sample type (Seawater, Fish, or Seaweed)
 
-            all_data.append(station_dict)
+        Each station is written to the JSON output file as soon as it is processed.
+        With an executor, stations are dispatched to it in chunks and collected
+        in registry order, so the output matches the serial path
 
-        pd.DataFrame(all_data).to_json(output_file, orient='records', indent=2)
+        Returns the flattened measurements, one row per measurement, or None
+        without collect, only one station being held in memory at a time then
+        """
+        writer = self.json_writer(sample_type)
+        stations = self.station_coord[sample_type]
+        # Built before dispatch so that workers receive it with the processor
+        self.file_index(sample_type_dir)
+
+        process = partial(self.process_station_entry, sample_type, sample_type_dir)
+        if executor is None:
+            results = map(process, stations)
+        else:
+            chunksize = max(1, len(stations) // (self.workers * 4))
+            results = executor.map(partial(collect_counters, process), stations,
+                                   chunksize=chunksize)
+
+        frames = []
+        # Without collect, the number of measurements of each station, for the metrics
+        sizes: List[int] = []
+        with writer or nullcontext():
+            for result in results:
+                station_dict = result
+                if executor is not None:
+                    # Counters incremented in the worker travel with its result
+                    station_dict, counters = result
+                    metrics.merge(counters)
+                if station_dict is not None:
+                    if writer:
+                        writer.write(station_dict)
+                    if collect:
+                        frames.append(flatten_station(station_dict))
+                    else:
+                        sizes.append(station_rows(station_dict))
+        if collect:
+            return self.measurement_table(sample_type, frames)
+        metrics.count(f"parse.stations.{sample_type}", sum(1 for size in sizes if size))
+        metrics.count(f"parse.rows.{sample_type}", sum(sizes))
+        return None
+
+    def json_writer(self, sample_type: str) -> Optional[StationJsonWriter]:
+        """Writer of the JSON output of a sample type, None without an output directory"""
+        if self.output_dir is None:
+            return None
+        output_file = compressed_path(generate_output_path(
+            self.output_dir, sample_type, layout_extension(self.json_layout)), self.compression)
+        return StationJsonWriter(output_file, self.json_layout, self.compact_json,
+                                 self.compresslevel)
 
-    def process_all_data(self):
+    @staticmethod
+    def measurement_table(sample_type: str, frames: List[pd.DataFrame]) -> pd.DataFrame:
+        """Flat measurements of a sample type, from the flattened frames of its stations"""
+        frames = [frame for frame in frames if not frame.empty]
+        metrics.count(f"parse.stations.{sample_type}", len(frames))
+        table = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        table = compact_measurements(table)
+        metrics.count(f"parse.rows.{sample_type}", len(table))
+        return table
+
+    def process_all_data(self, collect_tables: bool = True
+                         ) -> Optional[Dict[str, pd.DataFrame]]:
         """
-        Process all sample types and write results to separate
+        Process all sample types and write results to separate files
+
+        Returns the flattened measurements of each sample type, for the CSV
+        stage, or None without collect_tables
         """
         sample_types = {
-            "Seawater": join(self.input_dir, "Seawater"),
-            "Fish": join(self.input_dir, "Fishes"),
-            "Seaweed": join(self.input_dir, "Seaweeds"),
+            sample_type: join(self.input_dir, directory)
+            for sample_type, directory in SAMPLE_TYPE_DIRS.items()
         }
 
-        for sample_type, directory in sample_types.items():
-            self.process_station(sample_type, directory)
+        self.start_parse_cache_run()
+        pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else nullcontext()
+        with pool as executor:
+            tables = {
+                sample_type: self.process_station(sample_type, directory, executor,
+                                                  collect_tables)
+                for sample_type, directory in sample_types.items()
+            }
+
+        self.prune_parse_cache()
+        return tables if collect_tables else None
+
+    def process_ready_files(self, ready: Iterable[Optional[Tuple[str, str]]]
+                            ) -> Dict[str, pd.DataFrame]:
+        """
+        Process the stations as their files become ready, e.g. while they are
+        being downloaded, and write them to the JSON output
+
+        ready yields (sample type, file path) once a file is settled on disk, be
+        it written, unchanged or failed, or None when nothing is ready yet, so
+        that the stations finished meanwhile get written. Stations are written
+        in registry order, those finished early waiting for their predecessors,
+        so the output matches process_all_data. Stations whose file was never
+        announced are processed from the files on disk once ready is exhausted
+
+        Returns the flattened measurements of each sample type
+        """
+        self.start_parse_cache_run()
+        progress = {
+            sample_type: _StationProgress(self.station_coord[sample_type],
+                                          join(self.input_dir, directory))
+            for sample_type, directory in SAMPLE_TYPE_DIRS.items()
+        }
+
+        def submit(sample_type: str, position: int,
+                   csv_files: Optional[List[CsvFileEntry]] = None) -> None:
+            state = progress[sample_type]
+            state.submitted.add(position)
+            args = (sample_type, state.directory, state.stations[position], csv_files)
+            if executor is None:
+                state.results[position] = self.process_station_entry(*args)
+            else:
+                state.pending[position] = executor.submit(
+                    collect_counters, self.process_station_entry, *args)
+
+        pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else nullcontext()
+        with pool as executor, ExitStack() as stack:
+            writers: Dict[str, Optional[StationJsonWriter]] = {}
+            for sample_type in progress:
+                writer = self.json_writer(sample_type)
+                writers[sample_type] = stack.enter_context(writer) if writer else None
+            for item in ready:
+                if item is not None:
+                    sample_type, path = item
+                    state = progress[sample_type]
+                    for position in state.positions.get(self.get_id(path), []):
+                        if position not in state.submitted:
+                            submit(sample_type, position, csv_file_entries(path))
+                for sample_type, state in progress.items():
+                    state.flush(writers[sample_type])
+
+            # Stations without an announced file, from the files on disk
+            for sample_type, state in progress.items():
+                self.file_index(state.directory)
+                for position in range(len(state.stations)):
+                    if position not in state.submitted:
+                        submit(sample_type, position)
+                state.flush(writers[sample_type], wait=True)
+
+        tables = {
+            sample_type: self.measurement_table(sample_type, state.frames)
+            for sample_type, state in progress.items()
+        }
+        self.prune_parse_cache()
+        return tables
+
+    def start_parse_cache_run(self) -> None:
+        """Mark the start of a run, entries not used from then on are pruned after it"""
+        if self.parse_cache is not None:
+            self.parse_cache.start_run()
+
+    def prune_parse_cache(self) -> None:
+        """Remove the parse cache entries not used since the run started"""
+        if self.parse_cache is not None:
+            removed = self.parse_cache.prune()
+            if removed:
+                logger.info("Removed %d unused parse cache entries", removed)
+
+
+def station_rows(station: dict) -> int:
+    """Number of measurements of a processed station, as flatten_station would give"""
+    if "depth_data" in station:
+        parts = [depth_info["data"] for depth_info in station["depth_data"]]
+    else:
+        parts = [station.get("data")]
+    return sum(len(part) for part in parts if part is not None)
+
+
+def csv_file_entries(path: str) -> List[CsvFileEntry]:
+    """The file at path as the only file of its station, none when it does not exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return []
+    return [CsvFileEntry(basename(path), path, stat.st_mtime, stat.st_size)]
+
+
+class _StationProgress:
+    """Stations of one sample type processed out of order, written back in registry order"""
+    def __init__(self, stations: List[dict], directory: str):
+        self.stations = stations
+        self.directory = directory
+        # Station ID -> positions in the registry
+        self.positions: Dict[str, List[int]] = {}
+        for position, station in enumerate(stations):
+            self.positions.setdefault(str(station["id"]), []).append(position)
+        self.submitted: Set[int] = set()
+        self.pending: Dict[int, Future] = {}
+        self.results: Dict[int, Optional[dict]] = {}
+        self.frames: List[pd.DataFrame] = []
+        self.written = 0
+
+    def flush(self, writer: Optional[StationJsonWriter], wait: bool = False) -> None:
+        """Write the finished stations that no unfinished station precedes"""
+        for position, future in list(self.pending.items()):
+            if wait or future.done():
+                station_dict, counters = future.result()
+                metrics.merge(counters)
+                self.results[position] = station_dict
+                del self.pending[position]
+        while self.written in self.results:
+            station_dict = self.results.pop(self.written)
+            if station_dict is not None:
+                if writer:
+                    writer.write(station_dict)
+                self.frames.append(flatten_station(station_dict))
+            self.written += 1
@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from os.path import join
+from typing import Dict, List
+
+import pandas as pd
+
+from iaea.orbs import logger
+
+
+# Hive-style partitions below each sample type, e.g. sample_type=Fish/id=256/year=2026
+PARQUET_PARTITIONS = ["id", "year"]
+PARQUET_COMPRESSION = "zstd"
+PARQUET_MANIFEST = "manifest.json"
+
+# Low-cardinality text columns, stored dictionary-encoded
+CATEGORY_COLUMNS = ["org", "station", "depth", "Sample", "Radionuclide", "Unit"]
+TEXT_COLUMNS = ["begperiod_raw"]
+TIMESTAMP_COLUMNS = ["begperiod"]
+
+
+def require_pyarrow() -> None:
+    """Fail early when the optional Parquet dependency is not installed"""
+    try:
+        import pyarrow  # noqa: F401  pylint: disable=import-outside-toplevel,unused-import
+    except ImportError as exc:
+        raise ImportError(
+            "Parquet output requires pyarrow, install it with: pip install 'iaea.orbs[parquet]'"
+        ) from exc
+
+
+def typed_measurements(measurements: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    """
+    Give flat measurements a fixed, typed schema: every expected column is kept,
+    even when empty, and a sampling year is derived from 'begperiod'
+    """
+    df = measurements.reindex(columns=columns)
+    for column in df.columns:
+        if column == "id":
+            df[column] = df[column].astype("int32")
+        elif column in CATEGORY_COLUMNS:
+            df[column] = df[column].astype("string").astype("category")
+        elif column in TEXT_COLUMNS:
+            df[column] = df[column].astype("string")
+        elif column in TIMESTAMP_COLUMNS:
+            df[column] = pd.to_datetime(df[column], format="ISO8601").astype("datetime64[ms]")
+        else:
+            df[column] = df[column].astype("float64")
+
+    # Measurements without a readable sampling date are kept under year=0
+    df["year"] = df["begperiod"].dt.year.fillna(0).astype("int16")
+    return df
+
+
+def save_parquet_dataset(measurements: pd.DataFrame, columns: List[str], dataset_dir: str) -> dict:
+    """
+    Write the measurements of one sample type as a compressed Parquet dataset,
+    partitioned by station and sampling year
+
+    The dataset is written beside the previous one and swapped in once complete.
+    Returns its manifest entry
+    """
+    require_pyarrow()
+    df = typed_measurements(measurements, columns)
+
+    tmp_dir = f"{dataset_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    df.to_parquet(
+        tmp_dir,
+        engine="pyarrow",
+        compression=PARQUET_COMPRESSION,
+        partition_cols=PARQUET_PARTITIONS,
+        index=False,
+        basename_template="part-{i}.parquet",
+    )
+    shutil.rmtree(dataset_dir, ignore_errors=True)
+    os.replace(tmp_dir, dataset_dir)
+
+    years = df.loc[df["year"] > 0, "year"]
+    return {
+        "rows": len(df),
+        "stations": int(df["id"].nunique()),
+        "years": [int(years.min()), int(years.max())] if len(years) else [],
+        "columns": {column: str(dtype) for column, dtype in df.dtypes.items()},
+    }
+
+
+def save_parquet_datasets(tables: Dict[str, pd.DataFrame], columns: Dict[str, List[str]],
+                          output_dir: str) -> None:
+    """
+    Write one Parquet dataset per sample type under output_dir, together with a
+    manifest describing their partitioning, row counts and schemas
+    """
+    require_pyarrow()
+    os.makedirs(output_dir, exist_ok=True)
+
+    datasets = {}
+    for sample_type, measurements in tables.items():
+        path = f"sample_type={sample_type}"
+        datasets[sample_type] = {
+            "path": path,
+            **save_parquet_dataset(measurements, columns[sample_type], join(output_dir, path)),
+        }
+        logger.info("%s Parquet dataset saved to '%s'", sample_type, join(output_dir, path))
+
+    manifest = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "format": "parquet",
+        "compression": PARQUET_COMPRESSION,
+        "partitioning": ["sample_type", *PARQUET_PARTITIONS],
+        "datasets": datasets,
+    }
+    tmp_path = join(output_dir, f"{PARQUET_MANIFEST}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as outfile:
+        json.dump(manifest, outfile, indent=4)
+    os.replace(tmp_path, join(output_dir, PARQUET_MANIFEST))
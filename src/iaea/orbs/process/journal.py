@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict
+
+from iaea.orbs import logger
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class RunJournal:
+    """
+    Checkpoints of a generate-data run: the stages and the downloaded files it
+    completed, so that an interrupted run can be resumed where it stopped
+
+    The journal belongs to one command and its options. It is removed when the
+    run finishes, so that only an interrupted run leaves one behind
+    """
+    def __init__(self, path: str, command: str, options: Dict[str, Any],
+                 resume: bool = False, save_interval: float = 5.0):
+        self.path = Path(path)
+        # Seconds between two saves of the completed files, stages are saved at once
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._saved = 0.0
+        self._finished = False
+
+        data = {}
+        if resume and self.path.exists():
+            with open(self.path, "r", encoding="utf8") as journal_file:
+                data = json.load(journal_file)
+            if data.get("command") != command or data.get("options") != options:
+                logger.warning("The interrupted run in '%s' used another command or options, "
+                               "starting over", self.path)
+                data = {}
+        elif resume:
+            logger.info("No interrupted run to resume in '%s'", self.path)
+
+        self.resumed = bool(data)
+        self.command = command
+        self.options = options
+        self.started: str = data.get("started", _now())
+        self.stages: Dict[str, str] = data.get("stages", {})
+        self.files: Dict[str, str] = data.get("files", {})
+        if self.resumed:
+            logger.info("Resuming the run started %s: %d stage(s) and %d file(s) completed",
+                        self.started, len(self.stages), len(self.files))
+        self.save()
+
+    @staticmethod
+    def default_path(download_dir: str) -> str:
+        """Journal location beside the download directory"""
+        directory = Path(download_dir).resolve()
+        return str(directory.with_name(f"{directory.name}_journal.json"))
+
+    def stage_done(self, name: str) -> bool:
+        """Whether the stage was completed by the run being resumed"""
+        with self._lock:
+            return name in self.stages
+
+    def complete_stage(self, name: str) -> None:
+        """Record a completed stage"""
+        with self._lock:
+            self.stages[name] = _now()
+        self.save()
+
+    def file_done(self, key: str) -> bool:
+        """Whether the file, keyed like the download manifest, was already downloaded"""
+        with self._lock:
+            return key in self.files
+
+    def complete_file(self, key: str) -> None:
+        """Record a downloaded file, saving the journal at most every save_interval seconds"""
+        with self._lock:
+            self.files[key] = _now()
+            due = time.monotonic() - self._saved >= self.save_interval
+        if due:
+            self.save()
+
+    def save(self) -> None:
+        """
+        Write the journal to disk, replacing the previous version atomically
+
+        Nothing is written once the run finished, so that saving on the way out
+        does not bring back the journal of a completed run
+        """
+        with self._lock:
+            if self._finished:
+                return
+            data = {
+                "command": self.command,
+                "options": self.options,
+                "started": self.started,
+                "stages": self.stages,
+                "files": self.files,
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as outfile:
+                json.dump(data, outfile, indent=4)
+            os.replace(tmp_path, self.path)
+            self._saved = time.monotonic()
+
+    def finish(self) -> None:
+        """Remove the journal of a run that completed"""
+        with self._lock:
+            self._finished = True
+            if self.path.exists():
+                os.remove(self.path)
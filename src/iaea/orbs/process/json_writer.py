@@ -0,0 +1,121 @@
+import os
+from typing import Any, Dict, Iterator, List, Optional
+
+from iaea.orbs.utils import open_file
+from iaea.orbs.utils import path_compression
+
+# "json": one pretty-printed array of stations, "ndjson": one station per line,
+# "ndjson-measurements": one measurement per line, carrying its station fields
+JSON_LAYOUTS = ("json", "ndjson", "ndjson-measurements")
+
+# Same number encoding as DataFrame.to_json
+DOUBLE_PRECISION = 10
+
+
+def layout_extension(layout: str) -> str:
+    """File extension of the given JSON layout"""
+    return "json" if layout == "json" else "ndjson"
+
+
+def measurement_records(data: Any) -> List[Dict[str, Any]]:
+    """
+    Records of a measurement frame, missing values becoming None.
+    Measurements already held as records, e.g. loaded from JSON, are returned as is
+    """
+    if not hasattr(data, "to_dict"):
+        return data or []
+    return data.astype(object).where(data.notna(), None).to_dict(orient="records")
+
+
+def station_records(station: Dict[str, Any]) -> Dict[str, Any]:
+    """The station with its measurement frames converted to records, for serialization"""
+    record = dict(station)
+    if "data" in station:
+        record["data"] = measurement_records(station["data"])
+    if "depth_data" in station:
+        record["depth_data"] = [
+            {**depth_info, "data": measurement_records(depth_info["data"])}
+            for depth_info in station["depth_data"]
+        ]
+    return record
+
+
+def station_measurements(station: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Flatten a station into one record per measurement, with its station fields"""
+    header = {key: value for key, value in station.items() if key not in ("data", "depth_data")}
+    for depth_info in station.get("depth_data") or []:
+        for measurement in measurement_records(depth_info["data"]):
+            yield {**header, "depth": depth_info["depth"], **measurement}
+    for measurement in measurement_records(station.get("data")):
+        yield {**header, **measurement}
+
+
+class StationJsonWriter:
+    """
+    Write processed stations to a JSON file as they are produced, so that only
+    one station is held in memory at a time. The file is written beside the
+    output and moved into place once complete
+
+    The "json" layout matches DataFrame.to_json(orient='records', indent=2), or
+    DataFrame.to_json(orient='records') when compact. The file is compressed
+    when output_file has a .gz or .zst extension
+    """
+    def __init__(self, output_file: str, layout: str = "json", compact: bool = False,
+                 compresslevel: Optional[int] = None):
+        if layout not in JSON_LAYOUTS:
+            raise ValueError(f"Unknown JSON layout: '{layout}'")
+        # Imported here so that the layout names stay importable without pandas
+        from pandas.io.json import ujson_dumps  # pylint: disable=import-outside-toplevel
+        self._dumps = ujson_dumps
+        self.output_file = output_file
+        self.layout = layout
+        # No indentation in the "json" layout, the NDJSON layouts are always compact
+        self.compact = compact
+        self.compresslevel = compresslevel
+        self.count = 0
+        self._tmp_path = f"{output_file}.tmp"
+        self._file = None
+
+    def __enter__(self) -> "StationJsonWriter":
+        self._file = open_file(self._tmp_path, "w", path_compression(self.output_file),
+                               self.compresslevel, encoding="utf-8")
+        if self.layout == "json":
+            self._file.write("[")
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        failed = exc_info[0] is not None
+        if self.layout == "json" and not failed:
+            if self.compact:
+                self._file.write("]")
+            else:
+                self._file.write("\n]" if self.count else "\n\n]")
+        self._file.close()
+        # The output file is replaced only when every station was written
+        if failed:
+            os.remove(self._tmp_path)
+        else:
+            os.replace(self._tmp_path, self.output_file)
+
+    def write(self, station: Dict[str, Any]) -> None:
+        """
+        Append one station to the output file, its measurements being converted
+        from frames to records only here
+        """
+        if self.layout != "ndjson-measurements":
+            station = station_records(station)
+        if self.layout == "json" and self.compact:
+            self._file.write("," if self.count else "")
+            self._file.write(self._dumps(station, double_precision=DOUBLE_PRECISION))
+        elif self.layout == "json":
+            text = self._dumps(station, double_precision=DOUBLE_PRECISION, indent=2)
+            self._file.write(",\n" if self.count else "\n")
+            self._file.write("\n".join(f"  {line}" if line else line for line in text.split("\n")))
+        elif self.layout == "ndjson":
+            self._file.write(self._dumps(station, double_precision=DOUBLE_PRECISION) + "\n")
+        else:
+            self._file.writelines(
+                self._dumps(record, double_precision=DOUBLE_PRECISION) + "\n"
+                for record in station_measurements(station)
+            )
+        self.count += 1
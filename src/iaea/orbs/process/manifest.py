@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Set
+
+
+def file_sha256(content: bytes) -> str:
+    """Return the hex SHA-256 digest of the given content"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class DownloadManifest:
+    """
+    Persistent record of the downloaded files (ETag, Last-Modified, size and
+    content hash) and of the file numbers known to be missing on the server
+    """
+    def __init__(self, path: str, missing_recheck_days: float = 7.0):
+        self.path = Path(path)
+        self.missing_recheck = timedelta(days=missing_recheck_days)
+        self._lock = threading.Lock()
+
+        data = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf8") as manifest_file:
+                data = json.load(manifest_file)
+        self.files: Dict[str, dict] = data.get("files", {})
+        self.missing: Dict[str, str] = data.get("missing", {})
+
+    @staticmethod
+    def default_path(download_dir: str) -> str:
+        """Manifest location beside the download directory"""
+        directory = Path(download_dir).resolve()
+        return str(directory.with_name(f"{directory.name}_manifest.json"))
+
+    def is_known_missing(self, key: str) -> bool:
+        """Whether the file was missing at its last check and is not due for a re-check"""
+        with self._lock:
+            checked = self.missing.get(key)
+        if checked is None:
+            return False
+        return _now() - datetime.fromisoformat(checked) < self.missing_recheck
+
+    def conditional_headers(self, key: str, local_path: Path) -> Dict[str, str]:
+        """
+        Build If-None-Match / If-Modified-Since headers, provided the local copy
+        is still the one recorded in the manifest
+        """
+        with self._lock:
+            entry = self.files.get(key)
+        if not entry or not local_path.exists():
+            return {}
+        if local_path.stat().st_size != entry.get("size"):
+            return {}
+        if file_sha256(local_path.read_bytes()) != entry.get("sha256"):
+            return {}
+
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def record_file(self, key: str, headers, size: int, sha256: str) -> None:
+        """Record a successfully downloaded file, from its size and SHA-256 digest"""
+        entry = {
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "size": size,
+            "sha256": sha256,
+            "checked": _now().isoformat(),
+        }
+        with self._lock:
+            self.files[key] = entry
+            self.missing.pop(key, None)
+
+    def record_not_modified(self, key: str) -> None:
+        """Record a check that found the file unchanged"""
+        with self._lock:
+            self.files[key]["checked"] = _now().isoformat()
+
+    def record_missing(self, key: str) -> None:
+        """Record a file number the server does not provide"""
+        with self._lock:
+            self.files.pop(key, None)
+            self.missing[key] = _now().isoformat()
+
+    def file_numbers(self, category: str, prefix: str) -> Set[int]:
+        """File numbers of a dataset recorded as downloaded"""
+        start = f"{category}/{prefix}"
+        with self._lock:
+            keys = [key for key in self.files if key.startswith(start)]
+        numbers = (key[len(start):-len(".csv")] for key in keys)
+        return {int(number) for number in numbers if number.isdigit()}
+
+    def save(self) -> None:
+        """Write the manifest to disk, replacing the previous version atomically"""
+        with self._lock:
+            data = {"files": self.files, "missing": self.missing}
+            tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as outfile:
+                json.dump(data, outfile, indent=4, sort_keys=True)
+            os.replace(tmp_path, self.path)
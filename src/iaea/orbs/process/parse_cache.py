@@ -0,0 +1,109 @@
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from typing import Iterable, Optional
+
+from iaea.orbs import logger
+from iaea.orbs.process.manifest import file_sha256
+
+
+FINGERPRINT_FILE = "fingerprint"
+RUN_MARKER_FILE = "run_started"
+
+
+def files_fingerprint(version: str, paths: Iterable[str]) -> str:
+    """Hex digest of a parser version and the contents of the files it depends on"""
+    digest = hashlib.sha256(version.encode("utf-8"))
+    for path in paths:
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """
+    On-disk cache of parsed sample files, keyed by sample type and content hash
+
+    The cache is emptied whenever its fingerprint (parser version and reference
+    files) differs from the one its entries were written with. Entries are
+    separate files, so that worker processes can read and add them concurrently.
+    A non-empty directory without a fingerprint is not a parse cache and is
+    refused rather than cleared
+    """
+    def __init__(self, directory: str, fingerprint: str):
+        self.directory = Path(directory)
+        self.fingerprint = fingerprint
+
+        fingerprint_path = self.directory / FINGERPRINT_FILE
+        if fingerprint_path.exists():
+            if fingerprint_path.read_text() == fingerprint:
+                return
+            logger.info("Parse cache '%s' is out of date, clearing it", self.directory)
+            self.clear()
+        elif self.directory.exists() and any(self.directory.iterdir()):
+            raise ValueError(f"Refusing to use '{self.directory}' as parse cache: "
+                             f"it is not empty and has no '{FINGERPRINT_FILE}' file")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fingerprint_path.write_text(fingerprint)
+
+    def clear(self) -> None:
+        """Remove the entries, leftovers of interrupted writes and the fingerprint"""
+        for pattern in ("*.pickle", "*.pickle.*.tmp", RUN_MARKER_FILE, FINGERPRINT_FILE):
+            for path in self.directory.glob(pattern):
+                path.unlink()
+
+    @staticmethod
+    def default_path(download_dir: str) -> str:
+        """Cache location beside the download directory"""
+        directory = Path(download_dir).resolve()
+        return str(directory.with_name(f"{directory.name}_parse_cache"))
+
+    @staticmethod
+    def key(sample_type: str, content: bytes) -> str:
+        """Cache key of a sample file"""
+        return f"{sample_type}_{file_sha256(content)}"
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pickle"
+
+    def get(self, key: str) -> Optional[dict]:
+        """Cached parse result, or None when the file was not parsed before"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as cache_file:
+                result = pickle.load(cache_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            logger.warning("Ignoring unreadable parse cache entry '%s': %s", path, e)
+            return None
+        # Marks the entry as used by this run, see prune
+        os.utime(path)
+        return result
+
+    def put(self, key: str, result: dict) -> None:
+        """Store a parse result, replacing the entry atomically"""
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as cache_file:
+            pickle.dump(result, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def start_run(self) -> None:
+        """
+        Touch the run marker, the reference of prune
+
+        The marker and the entries get their times from the same file system
+        clock, which is coarser than time.time()
+        """
+        (self.directory / RUN_MARKER_FILE).touch()
+
+    def prune(self) -> int:
+        """Remove the entries not used since start_run, returning their number"""
+        since = (self.directory / RUN_MARKER_FILE).stat().st_mtime
+        removed = 0
+        for path in self.directory.glob("*.pickle"):
+            if path.stat().st_mtime < since:
+                path.unlink()
+                removed += 1
+        return removed
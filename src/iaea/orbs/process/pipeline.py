@@ -0,0 +1,78 @@
+import queue
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import pandas as pd
+
+from iaea.orbs.metrics import metrics
+from iaea.orbs.process.generate_json import SAMPLE_TYPE_DIRS
+from iaea.orbs.process.generate_json import DataProcessor
+
+
+# Download directory of a sample type -> the sample type
+DIRECTORY_SAMPLE_TYPES = {
+    directory: sample_type for sample_type, directory in SAMPLE_TYPE_DIRS.items()
+}
+# Seconds between two checks of a full or empty queue
+POLL_INTERVAL = 0.1
+# Queued after the last file
+_DONE = object()
+
+
+def run_pipeline(download: Callable[[Callable[[Path], None]], None], processor: DataProcessor,
+                 queue_size: int = 64) -> Dict[str, pd.DataFrame]:
+    """
+    Download and process at once: download runs in a background thread and
+    calls back with the path of each file it settles, which is queued for the
+    processor to parse its station while the next files are downloaded
+
+    The queue holds at most queue_size files, the download workers waiting
+    when the processing falls behind. Returns the flattened measurements of
+    each sample type, see DataProcessor.process_ready_files
+    """
+    files: "queue.Queue[object]" = queue.Queue(maxsize=max(1, queue_size))
+    stopped = threading.Event()
+    failures = []
+
+    def put(item: object) -> None:
+        # Gives up once the processing stopped, for the downloads to finish on their own
+        while not stopped.is_set():
+            try:
+                files.put(item, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                metrics.count("pipeline.queue_full")
+
+    def announce(path: Path) -> None:
+        put((DIRECTORY_SAMPLE_TYPES[path.parent.name], str(path)))
+
+    def produce() -> None:
+        try:
+            download(announce)
+        except BaseException as exc:  # pylint: disable=broad-except
+            failures.append(exc)
+        finally:
+            put(_DONE)
+
+    def ready() -> Iterator[Optional[Tuple[str, str]]]:
+        while True:
+            try:
+                item = files.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                yield None
+                continue
+            if item is _DONE:
+                # A failed download fails the processing too, leaving the outputs untouched
+                if failures:
+                    raise failures[0]
+                return
+            metrics.count("pipeline.files")
+            yield item
+
+    producer = threading.Thread(target=produce, name="orbs-download", daemon=True)
+    producer.start()
+    try:
+        return processor.process_ready_files(ready())
+    finally:
+        stopped.set()
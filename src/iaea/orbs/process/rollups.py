@@ -0,0 +1,229 @@
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+import pandas as pd
+
+from iaea.orbs import logger
+from iaea.orbs.metrics import metrics
+
+
+# Bump when the rollup definitions change, the stored rollups are then rebuilt
+ROLLUP_VERSION = 1
+
+# Time buckets of the rollups: length of the ISO sampling date prefix naming the bucket
+ROLLUP_PERIODS = {"month": len("YYYY-MM"), "year": len("YYYY")}
+
+# A rollup row summarizes one nuclide at one station and depth over one time bucket
+ROLLUP_KEYS = ["sample_type", "id", "depth", "nuclide", "unit"]
+ROLLUP_COLUMNS = [
+    "period", "bucket", *ROLLUP_KEYS, "org", "station", "count", "detected",
+    "detection_rate", "mean", "max", "latest_at", "latest_value", "latest_nd"
+]
+
+# Columns of the long measurements whose changes invalidate a month bucket
+HASHED_COLUMNS = [
+    "sample_type", "id", "org", "station", "depth", "begperiod", "Sample",
+    "Radionuclide", "Unit", "value", "value_unc", "nd", "nd_unc"
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    period TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    sample_type TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    depth TEXT NOT NULL,
+    nuclide TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    org TEXT,
+    station TEXT,
+    count INTEGER NOT NULL,
+    detected INTEGER NOT NULL,
+    detection_rate REAL NOT NULL,
+    mean REAL,
+    max REAL,
+    latest_at TEXT,
+    latest_value REAL,
+    latest_nd REAL
+);
+CREATE INDEX IF NOT EXISTS rollups_bucket ON rollups (period, sample_type, id, bucket);
+CREATE INDEX IF NOT EXISTS rollups_nuclide ON rollups (period, nuclide, bucket);
+CREATE TABLE IF NOT EXISTS buckets (
+    sample_type TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (sample_type, id, month)
+);
+"""
+
+BucketKey = Tuple[str, int, str]
+
+
+def rollup_input(long_tables: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """
+    Long measurements of every sample type (see generate_csv.long_measurements)
+    with their month and year buckets, measurements without a sampling date
+    being left out
+    """
+    # Labels as plain text, the categories of the sample types differing
+    frames = [
+        long.astype({column: object for column in long.select_dtypes("category").columns})
+        .assign(sample_type=sample_type)
+        for sample_type, long in long_tables.items() if not long.empty
+    ]
+    if not frames:
+        return pd.DataFrame(columns=HASHED_COLUMNS + list(ROLLUP_PERIODS))
+    df = pd.concat(frames, ignore_index=True)
+
+    dated = df["begperiod"].notna()
+    undated = int((~dated).sum())
+    if undated:
+        logger.warning("%d measurement(s) without a sampling date left out of the rollups",
+                       undated)
+        metrics.count("rollups.undated", undated)
+    df = df[dated].copy()
+    # Sampling dates are ISO timestamps, their buckets are prefixes
+    for period, length in ROLLUP_PERIODS.items():
+        df[period] = df["begperiod"].str[:length]
+    # Grouping keys as text, missing depths and units being empty
+    df["id"] = df["id"].astype("int64")
+    for column in ("depth", "Radionuclide", "Unit"):
+        df[column] = df[column].astype(object).where(df[column].notna(), "")
+    return df
+
+
+def bucket_hashes(df: pd.DataFrame) -> Dict[BucketKey, str]:
+    """
+    Content hash of each (sample type, station, month) bucket, combined from
+    vectorized row hashes so that it does not depend on the row order
+    """
+    if df.empty:
+        return {}
+    rows = pd.util.hash_pandas_object(df[HASHED_COLUMNS], index=False)
+    grouped = rows.groupby([df["sample_type"], df["id"], df["month"]], sort=False)
+    sums, counts = grouped.sum(), grouped.size()
+    return {
+        (sample_type, int(station_id), month): f"{int(total):016x}-{int(count)}"
+        for (sample_type, station_id, month), total, count in zip(sums.index, sums, counts)
+    }
+
+
+def aggregate(df: pd.DataFrame, period: str) -> pd.DataFrame:
+    """Rollup rows of the measurements over the buckets of a period, see ROLLUP_COLUMNS"""
+    df = df.rename(columns={"Radionuclide": "nuclide", "Unit": "unit", period: "bucket"})
+    keys = ROLLUP_KEYS + ["bucket"]
+    grouped = df.assign(detected=df["value"].notna()).groupby(keys, sort=False)
+    rollup = grouped.agg(
+        org=("org", "first"),
+        station=("station", "first"),
+        count=("value", "size"),
+        detected=("detected", "sum"),
+        mean=("value", "mean"),
+        max=("value", "max"),
+    )
+    rollup["detection_rate"] = rollup["detected"] / rollup["count"]
+
+    latest = df.sort_values("begperiod", kind="stable").drop_duplicates(keys, keep="last")
+    latest = latest.set_index(keys)[["begperiod", "value", "nd"]]
+    rollup = rollup.join(latest.rename(columns={
+        "begperiod": "latest_at", "value": "latest_value", "nd": "latest_nd"}))
+    return rollup.reset_index().assign(period=period).reindex(columns=ROLLUP_COLUMNS)
+
+
+def _in_buckets(df: pd.DataFrame, period: str, buckets: Set[BucketKey]) -> pd.Series:
+    """Mask of the measurements falling in the given (sample type, station, bucket) keys"""
+    keys = df["sample_type"] + "/" + df["id"].astype(str) + "/" + df[period]
+    return keys.isin({f"{sample_type}/{station_id}/{bucket}"
+                      for sample_type, station_id, bucket in buckets})
+
+
+def _value(value):
+    """Database value of a frame cell, NaN being stored as NULL"""
+    return None if pd.isna(value) else value
+
+
+def _open(db_path: str) -> sqlite3.Connection:
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(db_path)
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    if version != ROLLUP_VERSION:
+        connection.executescript("DROP TABLE IF EXISTS rollups; DROP TABLE IF EXISTS buckets;")
+        connection.execute(f"PRAGMA user_version = {ROLLUP_VERSION}")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def update_rollups(long_tables: Dict[str, pd.DataFrame], db_path: str) -> Dict[str, int]:
+    """
+    Bring the monthly and yearly rollups stored in db_path up to date with the
+    long measurements, recomputing only the buckets whose measurements changed
+
+    Each (sample type, station, month) bucket is hashed: a changed month is
+    aggregated again, along with its year, and the buckets that disappeared are
+    removed. Returns the number of month buckets changed and of rollup rows written
+    """
+    df = rollup_input(long_tables)
+    hashes = bucket_hashes(df)
+
+    connection = _open(db_path)
+    try:
+        stored = {
+            (sample_type, station_id, month): digest for sample_type, station_id, month, digest
+            in connection.execute("SELECT sample_type, id, month, hash FROM buckets")
+        }
+        changed: Set[BucketKey] = {
+            key for key, digest in hashes.items() if stored.get(key) != digest
+        }
+        removed: Set[BucketKey] = set(stored) - set(hashes)
+        months = changed | removed
+        years = {(sample_type, station_id, month[:4]) for sample_type, station_id, month in months}
+
+        frames = [
+            aggregate(df[_in_buckets(df, period, buckets)], period)
+            for period, buckets in (("month", changed), ("year", years)) if buckets
+        ]
+        rows = [tuple(_value(value) for value in row)
+                for frame in frames for row in frame.itertuples(index=False)]
+
+        with connection:
+            delete = ("DELETE FROM rollups "
+                      "WHERE period = ? AND sample_type = ? AND id = ? AND bucket = ?")
+            connection.executemany(delete, [("month", *key) for key in months])
+            connection.executemany(delete, [("year", *key) for key in years])
+            connection.executemany(
+                f"INSERT INTO rollups VALUES ({', '.join('?' * len(ROLLUP_COLUMNS))})", rows)
+            connection.executemany(
+                "DELETE FROM buckets WHERE sample_type = ? AND id = ? AND month = ?", removed)
+            connection.executemany(
+                "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)",
+                [(*key, hashes[key]) for key in changed]
+            )
+    finally:
+        connection.close()
+
+    metrics.count("rollups.buckets_changed", len(months))
+    metrics.count("rollups.rows_written", len(rows))
+    return {"buckets_changed": len(months), "rows_written": len(rows)}
+
+
+def read_rollups(db_path: str, period: str = "month", sample_type: Optional[str] = None,
+                 station_id: Optional[int] = None, nuclide: Optional[str] = None) -> pd.DataFrame:
+    """Stored rollups of a period, optionally of one sample type, station or nuclide"""
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"No such rollup database: '{db_path}'")
+    filters = [("period = ?", period), ("sample_type = ?", sample_type),
+               ("id = ?", station_id), ("nuclide = ?", nuclide)]
+    conditions = [condition for condition, value in filters if value is not None]
+    parameters = [value for _, value in filters if value is not None]
+    statement = (f"SELECT * FROM rollups WHERE {' AND '.join(conditions)} "
+                 "ORDER BY sample_type, id, depth, nuclide, unit, bucket")
+    connection = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        return pd.read_sql_query(statement, connection, params=parameters)
+    finally:
+        connection.close()
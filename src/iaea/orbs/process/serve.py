@@ -0,0 +1,303 @@
+import csv
+import io
+import json
+import sys
+import threading
+import time
+from dataclasses import fields
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from iaea.orbs import logger
+from iaea.orbs.metrics import metrics
+from iaea.orbs.process.generate_csv import LONG_COLUMNS
+from iaea.orbs.process.sqlite_store import QUERY_COLUMNS
+from iaea.orbs.process.sqlite_store import MeasurementQuery
+
+
+# Long measurement columns named and ordered like QUERY_COLUMNS, as 'query' returns them
+QUERY_NAMES = {"Sample": "sample", "Radionuclide": "nuclide", "Unit": "unit"}
+SNAPSHOT_COLUMNS = sorted(["sample_type", *LONG_COLUMNS],
+                          key=lambda column: QUERY_COLUMNS.index(QUERY_NAMES.get(column, column)))
+# Same order as the SQLite query
+SORT_COLUMNS = ["sample_type", "id", "begperiod", "depth", "Radionuclide"]
+# Equality filters of MeasurementQuery served from an index, by query column
+INDEXED_FILTERS = {
+    "sample_type": "sample_type", "station_id": "id", "station": "station",
+    "org": "org", "nuclide": "nuclide", "depth": "depth",
+}
+# URL parameters of /measurements, by MeasurementQuery field
+QUERY_PARAMETERS = {"station_id": "id"}
+OUTPUT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+CSV_HEADER = (",".join(QUERY_COLUMNS) + "\n").encode("utf-8")
+
+
+class MeasurementSnapshot:
+    """
+    Immutable in-memory copy of the long measurements (see
+    generate_csv.long_measurements), answering MeasurementQuery like the
+    SQLite store does
+
+    Rows are kept as tuples in QUERY_COLUMNS order, along with their encoded
+    NDJSON and CSV lines, so that answering a query only joins bytes. Each
+    equality filter has an index from its values to the sorted row positions,
+    and the dated rows are sorted once more by sampling date for the date ranges
+    """
+    def __init__(self, long_tables: Dict[str, pd.DataFrame]):
+        self.loaded_at = datetime.now(timezone.utc).isoformat()
+        # Set by MeasurementServer when the snapshot is swapped in
+        self.generation = 0
+
+        frames = [
+            long.astype({column: object for column in long.select_dtypes("category").columns})
+            .assign(sample_type=sample_type)
+            for sample_type, long in long_tables.items() if not long.empty
+        ]
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        df = df.reindex(columns=SNAPSHOT_COLUMNS)
+        df = df.sort_values(SORT_COLUMNS, kind="stable", na_position="first", ignore_index=True)
+        df = df.rename(columns=QUERY_NAMES)
+
+        self.rows: List[tuple] = list(
+            df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+        self.lines: Dict[str, List[bytes]] = {
+            output_format: encode_rows(self.rows, output_format) for output_format in OUTPUT_FORMATS
+        }
+        self._indexes: Dict[str, Dict[object, np.ndarray]] = {
+            column: df.groupby(column, sort=False).indices for column in INDEXED_FILTERS.values()
+        }
+        self._dates = df["begperiod"].fillna("").to_numpy(dtype=str)
+        dated = np.flatnonzero(self._dates != "")
+        self._by_date = dated[np.argsort(self._dates[dated], kind="stable")]
+        self._sorted_dates = self._dates[self._by_date]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _date_range(self, since: Optional[str], before: Optional[str]) -> np.ndarray:
+        """Sorted positions of the rows sampled in [since, before)"""
+        start = np.searchsorted(self._sorted_dates, since, "left") if since is not None else 0
+        end = np.searchsorted(self._sorted_dates, before, "left") if before is not None \
+            else len(self._sorted_dates)
+        return np.sort(self._by_date[start:end])
+
+    def positions(self, query: MeasurementQuery) -> np.ndarray:
+        """Sorted positions of the rows matching the query, before its limit"""
+        matches = []
+        for field, column in INDEXED_FILTERS.items():
+            value = getattr(query, field)
+            if value is not None:
+                matches.append(self._indexes[column].get(value, np.empty(0, dtype=np.intp)))
+        dated = query.since is not None or query.before is not None
+        if not matches:
+            return self._date_range(query.since, query.before) if dated \
+                else np.arange(len(self.rows))
+
+        matches.sort(key=len)
+        positions = matches[0]
+        for other in matches[1:]:
+            positions = np.intersect1d(positions, other, assume_unique=True)
+        if dated:
+            dates = self._dates[positions]
+            keep = dates != ""
+            if query.since is not None:
+                keep &= dates >= query.since
+            if query.before is not None:
+                keep &= dates < query.before
+            positions = positions[keep]
+        return positions
+
+    def query(self, query: MeasurementQuery) -> List[tuple]:
+        """Rows matching the query, see QUERY_COLUMNS"""
+        positions = self.positions(query)
+        if query.limit is not None:
+            positions = positions[:max(query.limit, 0)]
+        return [self.rows[position] for position in positions]
+
+    def encode(self, query: MeasurementQuery, output_format: str) -> Tuple[bytes, int]:
+        """Rows matching the query as an NDJSON or CSV document, and their number"""
+        positions = self.positions(query)
+        if query.limit is not None:
+            positions = positions[:max(query.limit, 0)]
+        lines = self.lines[output_format]
+        header = [CSV_HEADER] if output_format == "csv" else []
+        return b"".join(header + [lines[position] for position in positions]), len(positions)
+
+
+class _QueryHandler(BaseHTTPRequestHandler):
+    server: "MeasurementServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *_args) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, generation: int) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Snapshot-Generation", str(generation))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_json(self, status: int, data: dict, generation: int) -> None:
+        self._send(status, json.dumps(data).encode("utf-8"), "application/json", generation)
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Answer /measurements and /status from the current snapshot"""
+        # One snapshot per request, a refresh swapping in another one meanwhile
+        snapshot = self.server.snapshot
+        url = urlsplit(self.path)
+        if url.path == "/status":
+            self._send_json(200, self.server.status(snapshot), snapshot.generation)
+            return
+        if url.path != "/measurements":
+            self._send_json(404, {"error": f"No such endpoint: '{url.path}'"}, snapshot.generation)
+            return
+
+        start = time.perf_counter()
+        try:
+            query, output_format = parse_query(url.query)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)}, snapshot.generation)
+            return
+        body, count = snapshot.encode(query, output_format)
+        self._send(200, body, OUTPUT_FORMATS[output_format], snapshot.generation)
+        metrics.count("serve.queries")
+        metrics.count("serve.rows", count)
+        logger.debug("%s: %d row(s) in %.2f ms", self.path, count,
+                     (time.perf_counter() - start) * 1000)
+
+    do_HEAD = do_GET
+
+
+def parse_query(query_string: str):
+    """MeasurementQuery and output format of the URL parameters of /measurements"""
+    parameters = parse_qs(query_string, keep_blank_values=True)
+    values = {}
+    for field in fields(MeasurementQuery):
+        name = QUERY_PARAMETERS.get(field.name, field.name)
+        if name in parameters:
+            values[field.name] = parameters.pop(name)[-1]
+    output_format = parameters.pop("format", ["ndjson"])[-1]
+    if parameters:
+        raise ValueError(f"Unknown parameter(s): {', '.join(sorted(parameters))}")
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown format '{output_format}', expected one of "
+                         f"{', '.join(OUTPUT_FORMATS)}")
+    for field in ("station_id", "limit"):
+        if field in values:
+            try:
+                values[field] = int(values[field])
+            except ValueError:
+                raise ValueError(f"'{QUERY_PARAMETERS.get(field, field)}' must be an integer, "
+                                 f"not '{values[field]}'") from None
+    return MeasurementQuery(**values), output_format
+
+
+def encode_rows(rows: List[tuple], output_format: str) -> List[bytes]:
+    """One NDJSON or CSV line per row, like the 'query' command writes them"""
+    if output_format == "ndjson":
+        return [(json.dumps(dict(zip(QUERY_COLUMNS, row))) + "\n").encode("utf-8") for row in rows]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    lines = []
+    for row in rows:
+        writer.writerow(row)
+        lines.append(buffer.getvalue().encode("utf-8"))
+        buffer.seek(0)
+        buffer.truncate()
+    return lines
+
+
+class MeasurementServer(ThreadingHTTPServer):
+    """
+    Local HTTP endpoint answering measurement queries from an in-memory snapshot
+
+    A background thread rebuilds the snapshot every refresh_interval seconds
+    and swaps it in by replacing one reference: requests never wait for a
+    refresh, each one reading the snapshot current when it started
+    """
+    daemon_threads = True
+
+    def __init__(self, snapshot: MeasurementSnapshot, host: str = "127.0.0.1", port: int = 0,
+                 refresh: Optional[Callable[[], MeasurementSnapshot]] = None,
+                 refresh_interval: float = 0.0):
+        super().__init__((host, port), _QueryHandler)
+        snapshot.generation = 1
+        self._snapshot = snapshot
+        self._refresh = refresh
+        self.refresh_interval = refresh_interval
+        self.last_refresh: Optional[dict] = None
+        self._stopped = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the endpoints"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def snapshot(self) -> MeasurementSnapshot:
+        return self._snapshot
+
+    def swap(self, snapshot: MeasurementSnapshot) -> None:
+        """Make a new snapshot current, the requests in progress finishing on the old one"""
+        snapshot.generation = self._snapshot.generation + 1
+        self._snapshot = snapshot
+
+    def refresh(self) -> None:
+        """Rebuild the snapshot and swap it in, keeping the current one on failure"""
+        start = time.perf_counter()
+        try:
+            with metrics.stage("serve.refresh"):
+                snapshot = self._refresh()
+        except Exception as e:  # pylint: disable=broad-except
+            logger.exception("Snapshot refresh failed, still serving generation %d",
+                             self._snapshot.generation)
+            metrics.count("serve.refresh.failures")
+            self.last_refresh = {"at": datetime.now(timezone.utc).isoformat(), "error": str(e)}
+            return
+        self.swap(snapshot)
+        elapsed = time.perf_counter() - start
+        self.last_refresh = {"at": snapshot.loaded_at, "wall_s": round(elapsed, 4)}
+        logger.info("Snapshot generation %d: %d measurements, refreshed in %.2f s",
+                    snapshot.generation, len(snapshot), elapsed)
+
+    def _refresh_loop(self) -> None:
+        while not self._stopped.wait(self.refresh_interval):
+            self.refresh()
+
+    def status(self, snapshot: MeasurementSnapshot) -> dict:
+        """Generation and size of the snapshot, and outcome of the last refresh"""
+        return {
+            "generation": snapshot.generation,
+            "loaded_at": snapshot.loaded_at,
+            "measurements": len(snapshot),
+            "refresh_interval": self.refresh_interval,
+            "last_refresh": self.last_refresh,
+        }
+
+    def serve_forever(self, poll_interval: float = 0.5) -> None:
+        """Serve requests, refreshing the snapshot in the background when enabled"""
+        if self._refresh and self.refresh_interval > 0 and self._refresher is None:
+            self._refresher = threading.Thread(target=self._refresh_loop, daemon=True)
+            self._refresher.start()
+        super().serve_forever(poll_interval)
+
+    def handle_error(self, request, client_address) -> None:
+        """Ignore clients closing their keep-alive connections, report anything else"""
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def server_close(self) -> None:
+        self._stopped.set()
+        if self._refresher is not None:
+            self._refresher.join()
+        super().server_close()
@@ -0,0 +1,172 @@
+import os
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+
+SCHEMA = """
+CREATE TABLE stations (
+    station_key INTEGER PRIMARY KEY,
+    sample_type TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    org TEXT,
+    station TEXT,
+    lat REAL,
+    lon REAL,
+    UNIQUE (sample_type, id)
+);
+CREATE TABLE nuclides (
+    nuclide_key INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE measurements (
+    station_key INTEGER NOT NULL REFERENCES stations (station_key),
+    nuclide_key INTEGER NOT NULL REFERENCES nuclides (nuclide_key),
+    depth TEXT,
+    sampled_at TEXT,
+    begperiod_raw TEXT,
+    sample TEXT,
+    unit TEXT,
+    value REAL,
+    value_unc REAL,
+    nd REAL,
+    nd_unc REAL
+);
+"""
+
+# Created once the rows are loaded, which is faster than maintaining them while inserting
+INDEXES = """
+CREATE INDEX stations_org ON stations (org);
+CREATE INDEX stations_station ON stations (station);
+CREATE INDEX measurements_station ON measurements (station_key, nuclide_key, sampled_at);
+CREATE INDEX measurements_nuclide ON measurements (nuclide_key, sampled_at);
+CREATE INDEX measurements_depth ON measurements (depth);
+CREATE INDEX measurements_sampled_at ON measurements (sampled_at);
+"""
+
+QUERY_COLUMNS = [
+    "sample_type", "id", "org", "station", "lat", "lon", "depth", "begperiod",
+    "begperiod_raw", "sample", "nuclide", "value", "value_unc", "nd", "nd_unc", "unit"
+]
+
+
+def _value(value):
+    """Database value of a frame cell, NaN being stored as NULL"""
+    return None if value != value else value  # pylint: disable=comparison-with-itself
+
+
+def save_measurement_store(long_tables: Dict[str, Any], db_path: str) -> int:
+    """
+    Load the long-format measurement frames (see generate_csv.long_measurements)
+    of each sample type into a new SQLite database, replacing db_path once complete
+
+    All rows are bulk inserted in a single transaction and the indexes are
+    built afterwards. Returns the number of measurements
+    """
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    connection = sqlite3.connect(tmp_path)
+    try:
+        # A fresh file replaced at the end needs no rollback journal
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.executescript(SCHEMA)
+
+        stations: Dict[Tuple[str, int], int] = {}
+        nuclides: Dict[str, int] = {}
+        station_rows: List[tuple] = []
+        rows: List[tuple] = []
+        for sample_type, long in long_tables.items():
+            for record in long.itertuples(index=False):
+                key = (sample_type, int(record.id))
+                if key not in stations:
+                    stations[key] = len(stations) + 1
+                    station_rows.append((
+                        stations[key], sample_type, int(record.id), _value(record.org),
+                        _value(record.station), _value(record.lat), _value(record.lon),
+                    ))
+                nuclide = nuclides.setdefault(record.Radionuclide, len(nuclides) + 1)
+                rows.append((
+                    stations[key], nuclide, _value(record.depth), _value(record.begperiod),
+                    _value(record.begperiod_raw), _value(record.Sample), _value(record.Unit),
+                    _value(record.value), _value(record.value_unc),
+                    _value(record.nd), _value(record.nd_unc),
+                ))
+
+        with connection:
+            connection.executemany(
+                "INSERT INTO stations VALUES (?, ?, ?, ?, ?, ?, ?)", station_rows)
+            connection.executemany(
+                "INSERT INTO nuclides VALUES (?, ?)",
+                [(key, name) for name, key in nuclides.items()]
+            )
+            connection.executemany(
+                "INSERT INTO measurements VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        connection.executescript(INDEXES)
+        connection.execute("ANALYZE")
+    finally:
+        connection.close()
+
+    os.replace(tmp_path, db_path)
+    return len(rows)
+
+
+@dataclass
+class MeasurementQuery:
+    sample_type: Optional[str] = None  # "Seawater", "Fish" or "Seaweed"
+    station_id: Optional[int] = None   # Station ID of the registry
+    station: Optional[str] = None      # Station name, e.g. "T-1"
+    org: Optional[str] = None          # Organization, e.g. "TEPCO"
+    nuclide: Optional[str] = None      # e.g. "Cs-137" or "H-3:TFWT"
+    depth: Optional[str] = None        # e.g. "Surface" or "Bottom"
+    since: Optional[str] = None        # First sampling date, ISO e.g. "2023-01-01T12:00"
+    before: Optional[str] = None       # Sampling dates strictly before, ISO
+    limit: Optional[int] = None        # Maximum number of rows
+
+    def sql(self) -> Tuple[str, list]:
+        """SELECT statement and parameters of the query"""
+        filters = [
+            ("s.sample_type = ?", self.sample_type),
+            ("s.id = ?", self.station_id),
+            ("s.station = ?", self.station),
+            ("s.org = ?", self.org),
+            ("n.name = ?", self.nuclide),
+            ("m.depth = ?", self.depth),
+            ("m.sampled_at >= ?", self.since),
+            ("m.sampled_at < ?", self.before),
+        ]
+        conditions = [condition for condition, value in filters if value is not None]
+        parameters = [value for _, value in filters if value is not None]
+
+        statement = (
+            "SELECT s.sample_type, s.id, s.org, s.station, s.lat, s.lon, m.depth, m.sampled_at, "
+            "m.begperiod_raw, m.sample, n.name, m.value, m.value_unc, m.nd, m.nd_unc, m.unit "
+            "FROM measurements m "
+            "JOIN stations s ON s.station_key = m.station_key "
+            "JOIN nuclides n ON n.nuclide_key = m.nuclide_key"
+        )
+        if conditions:
+            statement += " WHERE " + " AND ".join(conditions)
+        statement += " ORDER BY s.sample_type, s.id, m.sampled_at, m.depth, n.name"
+        if self.limit is not None:
+            statement += " LIMIT ?"
+            parameters.append(self.limit)
+        return statement, parameters
+
+
+def query_measurements(db_path: str, query: MeasurementQuery) -> List[tuple]:
+    """Rows of the measurement store matching the query, see QUERY_COLUMNS"""
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"No such measurement database: '{db_path}'")
+    statement, parameters = query.sql()
+    connection = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        return connection.execute(statement, parameters).fetchall()
+    finally:
+        connection.close()
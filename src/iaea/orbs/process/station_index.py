@@ -0,0 +1,82 @@
+import math
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+
+def count_decimals(number) -> int:
+    """Count the number of decimal places in a float number"""
+    if '.' not in str(number):
+        return 0
+    return len(str(number).split('.')[1])
+
+
+class StationIndex:
+    """
+    In-memory lookup of station names by organization and coordinates
+
+    Exact matches round the queried coordinates to the precision each reference
+    point is written with, as the reference files mix 4 to 8 decimal places.
+    A grid of ``tolerance``-sized cells serves the nearest-point fallback.
+    """
+    def __init__(self, station_df: pd.DataFrame, tolerance: float = 0.0005):
+        self.tolerance = tolerance
+        # org -> (lon decimals, lat decimals) -> (rounded lon, rounded lat) -> (row, station)
+        self._exact: Dict[str, Dict[Tuple[int, int], Dict[Tuple[float, float], tuple]]] = \
+            defaultdict(lambda: defaultdict(dict))
+        # org -> grid cell -> [(lon, lat, row, station)]
+        self._grid: Dict[str, Dict[Tuple[int, int], List[tuple]]] = \
+            defaultdict(lambda: defaultdict(list))
+
+        columns = ["org", "station", "lon", "lat"]
+        for row, (org, station, lon, lat) in enumerate(station_df[columns].itertuples(index=False)):
+            lon, lat = float(lon), float(lat)
+            if math.isnan(lon) or math.isnan(lat):
+                continue
+            decimals = (count_decimals(lon), count_decimals(lat))
+            key = (round(lon, decimals[0]), round(lat, decimals[1]))
+            self._exact[org][decimals].setdefault(key, (row, station))
+            if tolerance > 0:
+                self._grid[org][self._cell(lon, lat)].append((lon, lat, row, station))
+
+    @classmethod
+    def from_csv(cls, csv_file: str, tolerance: float = 0.0005) -> "StationIndex":
+        """Build the index from a reference CSV file with org, station, lon and lat columns"""
+        return cls(pd.read_csv(csv_file, index_col=False), tolerance)
+
+    def _cell(self, lon: float, lat: float) -> Tuple[int, int]:
+        return math.floor(lon / self.tolerance), math.floor(lat / self.tolerance)
+
+    def match(self, lon: float, lat: float, organization: str) -> Optional[str]:
+        """Station of the first reference point matching the coordinates at its own precision"""
+        hits = [
+            points[key]
+            for (lon_decimals, lat_decimals), points in self._exact.get(organization, {}).items()
+            for key in [(round(float(lon), lon_decimals), round(float(lat), lat_decimals))]
+            if key in points
+        ]
+        return min(hits)[1] if hits else None
+
+    def nearest(self, lon: float, lat: float, organization: str) -> Optional[str]:
+        """Station of the closest reference point within the tolerance"""
+        grid = self._grid.get(organization)
+        if not grid:
+            return None
+        cell_x, cell_y = self._cell(lon, lat)
+        candidates = [
+            (math.hypot(point_lon - lon, point_lat - lat), row, station)
+            for offset_x in (-1, 0, 1)
+            for offset_y in (-1, 0, 1)
+            for point_lon, point_lat, row, station in
+            grid.get((cell_x + offset_x, cell_y + offset_y), [])
+        ]
+        distance, _, station = min(candidates, default=(math.inf, None, None))
+        return station if distance <= self.tolerance else None
+
+
+@lru_cache(maxsize=None)
+def load_station_index(csv_file: str, tolerance: float = 0.0005) -> StationIndex:
+    """Load a reference station file once per process"""
+    return StationIndex.from_csv(csv_file, tolerance)
@@ -1,6 +1,9 @@
-from os.path import exists, join
+from contextlib import contextmanager
+from os.path import dirname, exists, join
+import gzip
 import json
 import logging
+import os
 from dms2dec.dms_convert import dms2dec
 
 
@@ -23,10 +26,126 @@ def get_logger():
 logger = get_logger()
 
 
+def package_file(path: str) -> str:
+    """
+    Path of a data file shipped with the iaea.orbs package
+    """
+    try:
+        from importlib.resources import files  # pylint: disable=import-outside-toplevel
+    except ImportError:  # Python 3.8
+        return join(dirname(__file__), path)
+    return str(files("iaea.orbs").joinpath(path))
+
+
 def generate_output_path(output_dir, sample_type, file_format):
     return join(output_dir, f"{sample_type.lower()}_data.{file_format}")
 
 
+# Output compressions, by the extension they add to the file names
+COMPRESSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+# Levels used when none is given: zlib's usual trade-off, and zstd's own default
+DEFAULT_COMPRESSION_LEVELS = {"gzip": 6, "zstd": 3}
+
+
+def compressed_path(path, compression="none"):
+    """Path of a file written with the given compression"""
+    return f"{path}{COMPRESSIONS[compression]}"
+
+
+def path_compression(path):
+    """Compression of a file, told by its extension"""
+    for compression, extension in COMPRESSIONS.items():
+        if extension and str(path).endswith(extension):
+            return compression
+    return "none"
+
+
+def require_compression(compression):
+    """Fail early when the optional dependency of a compression is not installed"""
+    if compression == "zstd":
+        try:
+            import zstandard  # noqa: F401  pylint: disable=import-outside-toplevel,unused-import
+        except ImportError as exc:
+            raise ImportError(
+                "zstd compression requires zstandard, "
+                "install it with: pip install 'iaea.orbs[zstd]'"
+            ) from exc
+
+
+def open_file(path, mode="r", compression=None, compresslevel=None, **kwargs):
+    """
+    Open a file like open(), streaming it through gzip or zstd when compressed.
+    The compression is told by the file extension when not given, text files
+    are UTF-8 unless another encoding is given
+    """
+    compression = compression or path_compression(path)
+    encoding = kwargs.pop("encoding", None if "b" in mode else "utf-8")
+    if compression == "none":
+        return open(path, mode, encoding=encoding, **kwargs)
+    kwargs["encoding"] = encoding
+    writing = "r" not in mode
+    level = compresslevel if compresslevel is not None else DEFAULT_COMPRESSION_LEVELS[compression]
+    if compression == "gzip":
+        text_mode = mode if "b" in mode or "t" in mode else f"{mode}t"
+        if writing:
+            kwargs["compresslevel"] = level
+        return gzip.open(path, text_mode, **kwargs)
+
+    require_compression(compression)
+    import zstandard  # pylint: disable=import-outside-toplevel
+    if writing:
+        kwargs["cctx"] = zstandard.ZstdCompressor(level=level)
+    return zstandard.open(path, mode, **kwargs)
+
+
+@contextmanager
+def atomic_write(path, mode="w", compresslevel=None, **kwargs):
+    """
+    Open a temporary file beside path for writing, replacing path with it only
+    once the block completes, so that an interrupted write never leaves a
+    truncated file behind. The file is compressed when path has a .gz or .zst extension
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        with open_file(tmp_path, mode, path_compression(path), compresslevel,
+                       **kwargs) as outfile:
+            yield outfile
+        os.replace(tmp_path, path)
+    finally:
+        if exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def add_listen_arguments(parser, port):
+    """
+    Address and port arguments of a local HTTP server
+    """
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Address to listen on (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=port,
+        help="Port to listen on (default: %(default)s)"
+    )
+
+
+def serve_until_interrupted(server):
+    """
+    Serve requests until interrupted with Ctrl-C, then close the server
+    """
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
 def check_directory_exists(directories: list):
     """
     Check if the specified directories exist
@@ -38,19 +157,25 @@ def check_directory_exists(directories: list):
 
 def load_json_data(data_path):
     """
-    Load data from a JSON file
+    Load data from a JSON file, or a list of records from an NDJSON file,
+    either of them possibly gzip or zstd compressed
     """
-    with open(data_path, "r", encoding="utf8") as json_file:
+    compression = path_compression(data_path)
+    with open_file(data_path, "r", compression, encoding="utf8") as json_file:
+        if data_path[:len(data_path) - len(COMPRESSIONS[compression])].endswith(".ndjson"):
+            return [json.loads(line) for line in json_file if line.strip()]
         station_coord = json.load(json_file)
     return station_coord
 
 
-def save_json(json_path, dictionary: dict):
+def save_json(json_path, dictionary: dict, compact=False, compresslevel=None):
     """
-    Save JSON data to a file
+    Save JSON data to a file, indented or compact, and compressed when the
+    path has a .gz or .zst extension
     """
-    with open(json_path, "w", encoding="utf-8") as outfile:
-        json.dump(dictionary, outfile, indent=4)
+    layout = {"separators": (",", ":")} if compact else {"indent": 4}
+    with open_file(json_path, "w", compresslevel=compresslevel, encoding="utf-8") as outfile:
+        json.dump(dictionary, outfile, **layout)
 
 
 def dms_to_dd(degrees, minutes, seconds):
@@ -0,0 +1,51 @@
+import logging
+
+import pytest
+
+from iaea.orbs import logger
+from iaea.orbs.process.generate_csv import flatten_stations
+from iaea.orbs.process.generate_csv import long_measurements
+
+
+def fish_station(station_id, measurements):
+    """Processed Fish station with one Cs-137 record per (sampling date, value)"""
+    return {
+        "id": station_id,
+        "org": "TEPCO",
+        "station": f"F-{station_id}",
+        "lat": 37.4 + station_id / 100,
+        "lon": 141.0 + station_id / 100,
+        "data": [
+            {
+                "begperiod": begperiod,
+                "begperiod_raw": begperiod[:10].replace("-", "/"),
+                "Sample": "Flounder",
+                "Radionuclide": "Cs-137",
+                "Unit": "Bq/kg-wet",
+                "Dt": value,
+                "Dt_unc": None,
+                "ND": None if value is not None else 0.5,
+                "ND_unc": None,
+            }
+            for begperiod, value in measurements
+        ],
+    }
+
+
+@pytest.fixture(autouse=True)
+def isolated_logger(monkeypatch, tmp_path):
+    """Log to the test's directory rather than to the status.log of the working directory"""
+    handler = logging.FileHandler(tmp_path / "status.log")
+    monkeypatch.setattr(logger, "handlers", [handler])
+    yield
+    handler.close()
+
+
+@pytest.fixture
+def fish_tables():
+    """Long measurement tables (see generate_csv.long_measurements) of Fish stations"""
+    def tables(stations):
+        flat = flatten_stations(fish_station(station_id, measurements)
+                                for station_id, measurements in stations.items())
+        return {"Fish": long_measurements(flat)}
+    return tables
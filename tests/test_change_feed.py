@@ -0,0 +1,53 @@
+import json
+
+from iaea.orbs.process.change_feed import write_change_feed
+
+
+STATIONS = {
+    1: [("2024-01-05T10:00:00", 1.2), ("2024-02-03T10:00:00", 0.8)],
+    2: [("2024-01-15T09:00:00", 3.1)],
+}
+
+
+def read_feed(path):
+    with open(path, "r", encoding="utf-8") as feed:
+        return [json.loads(line) for line in feed]
+
+
+def test_first_run_inserts_everything(tmp_path, fish_tables):
+    counts = write_change_feed(fish_tables(STATIONS), str(tmp_path), run_id="run1")
+
+    assert counts == {"inserted": 3, "updated": 0, "deleted": 0}
+    operations = read_feed(tmp_path / "run1.ndjson")
+    assert [operation["op"] for operation in operations] == ["insert"] * 3
+    assert operations[0]["record"]["value"] == 1.2
+
+
+def test_delta_of_insert_update_and_delete(tmp_path, fish_tables):
+    feed_dir = str(tmp_path)
+    write_change_feed(fish_tables(STATIONS), feed_dir, run_id="run1")
+
+    # Station 1 changes one value and loses a measurement, station 2 gains one
+    changed = {
+        1: [("2024-01-05T10:00:00", 1.5)],
+        2: [("2024-01-15T09:00:00", 3.1), ("2024-03-01T09:00:00", 0.4)],
+    }
+    counts = write_change_feed(fish_tables(changed), feed_dir, run_id="run2")
+
+    assert counts == {"inserted": 1, "updated": 1, "deleted": 1}
+    inserted, updated, deleted = read_feed(tmp_path / "run2.ndjson")
+    assert inserted["op"] == "insert"
+    assert inserted["key"]["id"] == 2
+    assert inserted["record"]["begperiod"] == "2024-03-01T09:00:00"
+    assert updated["op"] == "update"
+    assert updated["record"]["value"] == 1.5
+    assert deleted == {"op": "delete", "key": {
+        "sample_type": "Fish", "id": 1, "depth": None, "begperiod": "2024-02-03T10:00:00",
+        "Sample": "Flounder", "Radionuclide": "Cs-137", "Unit": "Bq/kg-wet", "seq": 0}}
+
+    # Nothing changed since, no delta file is written
+    counts = write_change_feed(fish_tables(changed), feed_dir, run_id="run3")
+    assert counts == {"inserted": 0, "updated": 0, "deleted": 0}
+    assert not (tmp_path / "run3.ndjson").exists()
+    assert sorted(path.name for path in tmp_path.glob("*.ndjson")) == [
+        "run1.ndjson", "run2.ndjson"]
@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+from iaea.orbs.process.rollups import ROLLUP_PERIODS
+from iaea.orbs.process.rollups import read_rollups
+from iaea.orbs.process.rollups import update_rollups
+
+
+STATIONS = {
+    1: [("2024-01-05T10:00:00", 1.2), ("2024-01-20T10:00:00", None), ("2024-02-03T10:00:00", 0.8)],
+    2: [("2023-12-10T09:00:00", 2.5), ("2024-01-15T09:00:00", 3.1), ("2024-03-01T09:00:00", 1.9)],
+}
+
+
+def test_first_update_writes_every_bucket(tmp_path, fish_tables):
+    db_path = str(tmp_path / "rollups.sqlite")
+    result = update_rollups(fish_tables(STATIONS), db_path)
+
+    # Months 2024-01 and 2024-02 of station 1, 2023-12, 2024-01 and 2024-03 of station 2
+    assert result["buckets_changed"] == 5
+    january = read_rollups(db_path, "month", station_id=1).set_index("bucket").loc["2024-01"]
+    assert january["count"] == 2
+    assert january["detected"] == 1
+    assert january["mean"] == pytest.approx(1.2)
+    assert january["latest_nd"] == pytest.approx(0.5)
+
+
+def test_incremental_update_matches_full_rebuild(tmp_path, fish_tables):
+    incremental_db = str(tmp_path / "incremental.sqlite")
+    update_rollups(fish_tables(STATIONS), incremental_db)
+
+    # Station 2 changes one value and gains a measurement, station 1 is unchanged
+    changed = dict(STATIONS)
+    changed[2] = [("2023-12-10T09:00:00", 2.5), ("2024-01-15T09:00:00", 4.0),
+                  ("2024-03-01T09:00:00", 1.9), ("2024-03-20T09:00:00", 0.7)]
+    result = update_rollups(fish_tables(changed), incremental_db)
+    assert result["buckets_changed"] == 2
+
+    full_db = str(tmp_path / "full.sqlite")
+    update_rollups(fish_tables(changed), full_db)
+    for period in ROLLUP_PERIODS:
+        pd.testing.assert_frame_equal(read_rollups(incremental_db, period),
+                                      read_rollups(full_db, period))
+
+
+def test_removed_station_is_dropped(tmp_path, fish_tables):
+    db_path = str(tmp_path / "rollups.sqlite")
+    update_rollups(fish_tables(STATIONS), db_path)
+
+    result = update_rollups(fish_tables({1: STATIONS[1]}), db_path)
+    assert result["buckets_changed"] == 3
+    for period in ROLLUP_PERIODS:
+        assert read_rollups(db_path, period, station_id=2).empty
+    assert update_rollups(fish_tables({1: STATIONS[1]}), db_path)["buckets_changed"] == 0